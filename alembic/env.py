@@ -31,12 +31,20 @@ sync_url = str(settings.db.url).replace('+asyncpg', '')
 config.set_main_option("sqlalchemy.url", sync_url)
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    """Skip the daily price_ticks partitions, they are managed at runtime by PriceStorageMaintenance."""
+    if type_ == "table" and reflected and compare_to is None and name.startswith("price_ticks_p"):
+        return False
+    return True
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode."""
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -55,7 +63,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_object=include_object
         )
 
         with context.begin_transaction():
@@ -1,6 +1,6 @@
 import os
 
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
 from pydantic.networks import PostgresDsn
 
 from dotenv import load_dotenv
@@ -22,8 +22,125 @@ POSTGRES_ECHO = os.getenv("POSTGRES_ECHO", "True").lower() in ('true', '1')
 # App ENV variables
 DEBUG = os.getenv("DEBUG", "True").lower() in ('true', '1')
 
+# Idle pooled clients are evicted after this many seconds
 HTTP_CLIENT_TIMEOUT = int(os.getenv("HTTP_CLIENT_TIMEOUT", "300"))
+# Total time of one upstream request attempt
+HTTP_REQUEST_TIMEOUT = float(os.getenv("HTTP_REQUEST_TIMEOUT", "10"))
+# A host's circuit opens after this many consecutive failures and lets a probe through after the reset timeout
+HTTP_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("HTTP_CIRCUIT_FAILURE_THRESHOLD", "5"))
+HTTP_CIRCUIT_RESET_TIMEOUT = float(os.getenv("HTTP_CIRCUIT_RESET_TIMEOUT", "30"))
+# A GET that is not answered within this many seconds is sent once more, the first answer wins; 0 to disable
+HTTP_HEDGE_DELAY = float(os.getenv("HTTP_HEDGE_DELAY", "0"))
 HTTP_CLIENTS_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_CLIENTS_MAX_KEEPALIVE_CONNECTIONS", "5"))
+# Seconds a request waits for a free pooled client
+HTTP_CLIENT_ACQUIRE_TIMEOUT = float(os.getenv("HTTP_CLIENT_ACQUIRE_TIMEOUT", "30"))
+# One long-lived session per upstream host instead of the client pool, connections and TLS sessions are reused
+HTTP_SHARED_SESSIONS = os.getenv("HTTP_SHARED_SESSIONS", "True").lower() in ('true', '1')
+HTTP_CONNECTOR_LIMIT = int(os.getenv("HTTP_CONNECTOR_LIMIT", "100"))
+HTTP_CONNECTOR_LIMIT_PER_HOST = int(os.getenv("HTTP_CONNECTOR_LIMIT_PER_HOST", "10"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+# Byte budget of the Cache-Control / ETag aware response cache of ClientManager.get_json(), 0 to disable
+HTTP_RESPONSE_CACHE_BYTES = int(os.getenv("HTTP_RESPONSE_CACHE_BYTES", str(8 * 1024 * 1024)))
+# While an upstream fails, cached responses expired at most this many seconds ago are served instead; 0 to never
+HTTP_MAX_STALE = float(os.getenv("HTTP_MAX_STALE", "300"))
+# Per-host token buckets, "host=requests_per_second:burst" separated by commas
+HTTP_RATE_LIMITS = os.getenv("HTTP_RATE_LIMITS", "api.coingecko.com=0.2:5,rest.coincap.io=2:10,api.thecatapi.com=5:10")
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "1"))
+# Longest backoff between retries; a Retry-After above it is not waited for, the request fails right away
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "60"))
+
+# Price service ENV variables
+PRICE_CACHE_TTL = int(os.getenv("PRICE_CACHE_TTL", "60"))
+PRICE_FETCH_CHUNK_SIZE = int(os.getenv("PRICE_FETCH_CHUNK_SIZE", "250"))
+PRICE_FETCH_CONCURRENCY = int(os.getenv("PRICE_FETCH_CONCURRENCY", "4"))
+# Providers: coingecko, coincap, local (offline replay / random walk)
+PRICE_PROVIDER = os.getenv("PRICE_PROVIDER", "coingecko")
+# Off by default: coincap prices only the ids of PRICE_COINCAP_ID_MAP and its v3 API needs a key
+PRICE_FALLBACK_PROVIDERS = [name.strip() for name in os.getenv("PRICE_FALLBACK_PROVIDERS", "").split(",")
+                            if name.strip()]
+PRICE_COINCAP_URL = os.getenv("PRICE_COINCAP_URL", "https://rest.coincap.io/v3/assets")
+PRICE_COINCAP_API_KEY = os.getenv("PRICE_COINCAP_API_KEY", "")
+# CoinGecko id -> CoinCap id, "coingecko_id=coincap_id" separated by commas; unmapped ids are not asked for
+PRICE_COINCAP_ID_MAP = os.getenv(
+    "PRICE_COINCAP_ID_MAP",
+    "bitcoin=bitcoin,ethereum=ethereum,tether=tether,binancecoin=binance-coin,solana=solana,ripple=xrp,"
+    "usd-coin=usd-coin,cardano=cardano,dogecoin=dogecoin,tron=tron,avalanche-2=avalanche,polkadot=polkadot,"
+    "chainlink=chainlink,litecoin=litecoin,bitcoin-cash=bitcoin-cash,stellar=stellar,monero=monero"
+)
+PRICE_LOCAL_FILE = os.getenv("PRICE_LOCAL_FILE", "")
+PRICE_LOCAL_SEED = int(os.getenv("PRICE_LOCAL_SEED", "0"))
+PRICE_LOCAL_VOLATILITY = float(os.getenv("PRICE_LOCAL_VOLATILITY", "0.002"))
+# Samples kept in memory per coin (a day at the 30s minimum poll interval)
+PRICE_HISTORY_CAPACITY = int(os.getenv("PRICE_HISTORY_CAPACITY", "2880"))
+# Latest prices are kept in this file across restarts, empty to disable; {role} is replaced with bot or worker,
+# so the bot and the workers do not overwrite each other's snapshots
+PRICE_SNAPSHOT_FILE = os.getenv("PRICE_SNAPSHOT_FILE", "price_snapshot.{role}.msgpack")
+# Older snapshot entries are neither loaded nor served as stale prices
+PRICE_SNAPSHOT_MAX_AGE = int(os.getenv("PRICE_SNAPSHOT_MAX_AGE", "3600"))
+
+# Price monitor ENV variables
+PRICE_MONITOR_UPDATE_INTERVAL = int(os.getenv("PRICE_MONITOR_UPDATE_INTERVAL", "300"))
+PRICE_MONITOR_NOTIFY_CONCURRENCY = int(os.getenv("PRICE_MONITOR_NOTIFY_CONCURRENCY", "10"))
+PRICE_MONITOR_NOTIFY_QUEUE_SIZE = int(os.getenv("PRICE_MONITOR_NOTIFY_QUEUE_SIZE", "1000"))
+# Run the monitor inside the polling process; must be False when monitor_worker.py processes are deployed,
+# workers refuse to start otherwise and the embedded monitor stands down while workers are alive
+PRICE_MONITOR_EMBEDDED = os.getenv("PRICE_MONITOR_EMBEDDED", "True").lower() in ('true', '1')
+# Per-coin poll intervals adapt to volatility, threshold proximity and watchers within these bounds
+PRICE_MONITOR_ADAPTIVE_POLLING = os.getenv("PRICE_MONITOR_ADAPTIVE_POLLING", "True").lower() in ('true', '1')
+PRICE_MONITOR_MIN_POLL_INTERVAL = int(os.getenv("PRICE_MONITOR_MIN_POLL_INTERVAL", "30"))
+PRICE_MONITOR_MAX_POLL_INTERVAL = int(os.getenv("PRICE_MONITOR_MAX_POLL_INTERVAL", "1800"))
+# Volatility of a coin is its price change rate over at least this many seconds, not between adjacent samples
+PRICE_MONITOR_CHANGE_RATE_WINDOW = int(os.getenv("PRICE_MONITOR_CHANGE_RATE_WINDOW", "120"))
+# Coins whose price moved by less than this fraction since the last evaluation are skipped
+PRICE_MONITOR_PRICE_CHANGE_EPSILON = float(os.getenv("PRICE_MONITOR_PRICE_CHANGE_EPSILON", "0.0001"))
+# A fired min/max alert is re-armed once the price leaves its threshold by this fraction
+PRICE_MONITOR_ALERT_REARM_BAND = float(os.getenv("PRICE_MONITOR_ALERT_REARM_BAND", "0.01"))
+# Full reload of the threshold index; edits are synced every cycle through updated_at
+PRICE_MONITOR_INDEX_REFRESH_INTERVAL = int(os.getenv("PRICE_MONITOR_INDEX_REFRESH_INTERVAL", "900"))
+PRICE_MONITOR_TOTAL_SHARDS = int(os.getenv("PRICE_MONITOR_TOTAL_SHARDS", "16"))
+# Workers split the shards evenly between the live workers; an optional hard cap on top, 0 - no cap
+PRICE_MONITOR_MAX_SHARDS_PER_WORKER = int(os.getenv("PRICE_MONITOR_MAX_SHARDS_PER_WORKER", "0"))
+PRICE_MONITOR_LEASE_RENEW_INTERVAL = int(os.getenv("PRICE_MONITOR_LEASE_RENEW_INTERVAL", "30"))
+PRICE_MONITOR_LEASE_LOCK_NAMESPACE = int(os.getenv("PRICE_MONITOR_LEASE_LOCK_NAMESPACE", "7340"))
+
+# Price stream ENV variables
+PRICE_STREAM_ENABLED = os.getenv("PRICE_STREAM_ENABLED", "False").lower() in ('true', '1')
+# Query string ?assets=<ids> is appended, messages are {"<id>": "<price>", ...} (CoinCap format);
+# ids are translated with PRICE_COINCAP_ID_MAP, unmapped coins and coins without ticks for STALE_TIMEOUT are polled
+PRICE_STREAM_URL = os.getenv("PRICE_STREAM_URL", "wss://ws.coincap.io/prices")
+PRICE_STREAM_HEARTBEAT = float(os.getenv("PRICE_STREAM_HEARTBEAT", "20"))
+# Reconnect when no message arrived for this long, even if pings are answered
+PRICE_STREAM_STALE_TIMEOUT = float(os.getenv("PRICE_STREAM_STALE_TIMEOUT", "60"))
+# Ticks of one coin are coalesced and handed to the monitor at most once per this interval
+PRICE_STREAM_DEBOUNCE = float(os.getenv("PRICE_STREAM_DEBOUNCE", "2"))
+PRICE_STREAM_RECONNECT_MAX_DELAY = float(os.getenv("PRICE_STREAM_RECONNECT_MAX_DELAY", "60"))
+PRICE_STREAM_QUEUE_SIZE = int(os.getenv("PRICE_STREAM_QUEUE_SIZE", "16"))
+
+# Cat image ENV variables
+CAT_IMAGE_POOL_SIZE = int(os.getenv("CAT_IMAGE_POOL_SIZE", "30"))
+# The pool is refilled in the background once it holds fewer images than this
+CAT_IMAGE_POOL_LOW_WATER_MARK = int(os.getenv("CAT_IMAGE_POOL_LOW_WATER_MARK", "10"))
+# Images per TheCatAPI search, without an API key the API returns at most 10
+CAT_IMAGE_BATCH_SIZE = int(os.getenv("CAT_IMAGE_BATCH_SIZE", "10"))
+CAT_API_KEY = os.getenv("CAT_API_KEY", "")
+# Telegram file_ids of sent cat photos, recycled while the image pool is empty; an empty file name keeps
+# them in memory only
+CAT_FILE_ID_CACHE_SIZE = int(os.getenv("CAT_FILE_ID_CACHE_SIZE", "1000"))
+# {role} is replaced with bot or worker, so the bot and the workers do not overwrite each other's caches
+CAT_FILE_ID_CACHE_FILE = os.getenv("CAT_FILE_ID_CACHE_FILE", "cat_file_ids.{role}.msgpack")
+
+# Price tick storage ENV variables
+PRICE_STORAGE_ENABLED = os.getenv("PRICE_STORAGE_ENABLED", "True").lower() in ('true', '1')
+PRICE_STORAGE_FLUSH_INTERVAL = int(os.getenv("PRICE_STORAGE_FLUSH_INTERVAL", "10"))
+PRICE_STORAGE_MAX_BUFFERED_TICKS = int(os.getenv("PRICE_STORAGE_MAX_BUFFERED_TICKS", "100000"))
+# Raw ticks are kept in daily partitions, whole partitions are dropped after the retention period
+PRICE_STORAGE_TICKS_RETENTION_DAYS = int(os.getenv("PRICE_STORAGE_TICKS_RETENTION_DAYS", "7"))
+PRICE_STORAGE_PARTITIONS_AHEAD = int(os.getenv("PRICE_STORAGE_PARTITIONS_AHEAD", "2"))
+PRICE_STORAGE_ROLLUP_INTERVAL = int(os.getenv("PRICE_STORAGE_ROLLUP_INTERVAL", "60"))
+PRICE_STORAGE_MINUTE_ROLLUP_RETENTION_DAYS = int(os.getenv("PRICE_STORAGE_MINUTE_ROLLUP_RETENTION_DAYS", "30"))
+PRICE_STORAGE_MAINTENANCE_LOCK_KEY = int(os.getenv("PRICE_STORAGE_MAINTENANCE_LOCK_KEY", "7341"))
 
 
 class DBConfig(BaseModel):
@@ -53,13 +170,170 @@ class RunConfig(BaseModel):
 
 class HTTPClientConfig(BaseModel):
     timeout: int = HTTP_CLIENT_TIMEOUT
+    request_timeout: float = HTTP_REQUEST_TIMEOUT
+    circuit_failure_threshold: int = HTTP_CIRCUIT_FAILURE_THRESHOLD
+    circuit_reset_timeout: float = HTTP_CIRCUIT_RESET_TIMEOUT
+    hedge_delay: float = HTTP_HEDGE_DELAY
     max_keepalive_connections: int = HTTP_CLIENTS_MAX_KEEPALIVE_CONNECTIONS
+    acquire_timeout: float = HTTP_CLIENT_ACQUIRE_TIMEOUT
+    shared_sessions: bool = HTTP_SHARED_SESSIONS
+    connector_limit: int = HTTP_CONNECTOR_LIMIT
+    connector_limit_per_host: int = HTTP_CONNECTOR_LIMIT_PER_HOST
+    dns_cache_ttl: int = HTTP_DNS_CACHE_TTL
+    keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT
+    response_cache_bytes: int = HTTP_RESPONSE_CACHE_BYTES
+    max_stale: float = HTTP_MAX_STALE
+    # The raw env string is parsed by validate_rate_limits, defaults are not validated otherwise
+    rate_limits: dict[str, tuple[float, float]] = Field(HTTP_RATE_LIMITS, validate_default=True)
+    max_retries: int = HTTP_MAX_RETRIES
+    backoff_base: float = HTTP_BACKOFF_BASE
+    backoff_max: float = HTTP_BACKOFF_MAX
+
+    @field_validator('rate_limits', mode='before')
+    def validate_rate_limits(cls, v):
+        if not isinstance(v, str):
+            return v
+        rate_limits = {}
+        for item in filter(None, (item.strip() for item in v.split(","))):
+            host, _, limit = item.partition("=")
+            rate, _, burst = limit.partition(":")
+            try:
+                rate, burst = float(rate), float(burst)
+            except ValueError:
+                rate = burst = 0.0
+            if not host.strip() or rate <= 0 or burst < 1:
+                raise ValueError(f"Invalid HTTP_RATE_LIMITS entry {item!r}, expected host=requests_per_second:burst "
+                                 f"with a positive rate and a burst of at least 1")
+            rate_limits[host.strip()] = (rate, burst)
+        return rate_limits
+
+
+class PriceServiceConfig(BaseModel):
+    cache_ttl: int = PRICE_CACHE_TTL
+    chunk_size: int = PRICE_FETCH_CHUNK_SIZE
+    fetch_concurrency: int = PRICE_FETCH_CONCURRENCY
+    provider: str = PRICE_PROVIDER
+    fallback_providers: list[str] = PRICE_FALLBACK_PROVIDERS
+    coincap_url: str = PRICE_COINCAP_URL
+    coincap_api_key: str = PRICE_COINCAP_API_KEY
+    # The raw env string is parsed by validate_coincap_id_map
+    coincap_id_map: dict[str, str] = Field(PRICE_COINCAP_ID_MAP, validate_default=True)
+    local_file: str = PRICE_LOCAL_FILE
+    local_seed: int = PRICE_LOCAL_SEED
+    local_volatility: float = PRICE_LOCAL_VOLATILITY
+    history_capacity: int = PRICE_HISTORY_CAPACITY
+    snapshot_file: str = PRICE_SNAPSHOT_FILE
+    snapshot_max_age: int = PRICE_SNAPSHOT_MAX_AGE
+
+    @field_validator('chunk_size', 'fetch_concurrency', 'history_capacity', 'snapshot_max_age')
+    def validate_positive_int(cls, v):
+        if v <= 0:
+            raise ValueError("Must be a positive integer")
+        return v
+
+    @field_validator('coincap_id_map', mode='before')
+    def validate_coincap_id_map(cls, v):
+        if not isinstance(v, str):
+            return v
+        id_map = {}
+        for item in filter(None, (item.strip() for item in v.split(","))):
+            coingecko_id, _, coincap_id = item.partition("=")
+            if not coingecko_id.strip() or not coincap_id.strip():
+                raise ValueError(f"Invalid PRICE_COINCAP_ID_MAP entry {item!r}, expected coingecko_id=coincap_id")
+            id_map[coingecko_id.strip()] = coincap_id.strip()
+        return id_map
+
+
+class PriceMonitorConfig(BaseModel):
+    update_interval: int = PRICE_MONITOR_UPDATE_INTERVAL
+    notify_concurrency: int = PRICE_MONITOR_NOTIFY_CONCURRENCY
+    notify_queue_size: int = PRICE_MONITOR_NOTIFY_QUEUE_SIZE
+    embedded: bool = PRICE_MONITOR_EMBEDDED
+    adaptive_polling: bool = PRICE_MONITOR_ADAPTIVE_POLLING
+    min_poll_interval: int = PRICE_MONITOR_MIN_POLL_INTERVAL
+    max_poll_interval: int = PRICE_MONITOR_MAX_POLL_INTERVAL
+    change_rate_window: int = PRICE_MONITOR_CHANGE_RATE_WINDOW
+    price_change_epsilon: float = PRICE_MONITOR_PRICE_CHANGE_EPSILON
+    alert_rearm_band: float = PRICE_MONITOR_ALERT_REARM_BAND
+    index_refresh_interval: int = PRICE_MONITOR_INDEX_REFRESH_INTERVAL
+    total_shards: int = PRICE_MONITOR_TOTAL_SHARDS
+    max_shards_per_worker: int = PRICE_MONITOR_MAX_SHARDS_PER_WORKER
+    lease_renew_interval: int = PRICE_MONITOR_LEASE_RENEW_INTERVAL
+    lease_lock_namespace: int = PRICE_MONITOR_LEASE_LOCK_NAMESPACE
+
+    @field_validator('update_interval', 'notify_concurrency', 'notify_queue_size', 'min_poll_interval',
+                     'max_poll_interval', 'change_rate_window', 'index_refresh_interval', 'total_shards',
+                     'lease_renew_interval')
+    def validate_positive_int(cls, v):
+        if v <= 0:
+            raise ValueError("Must be a positive integer")
+        return v
+
+    @field_validator('price_change_epsilon', 'alert_rearm_band')
+    def validate_non_negative(cls, v):
+        if v < 0:
+            raise ValueError("Must not be negative")
+        return v
+
+
+class PriceStreamConfig(BaseModel):
+    enabled: bool = PRICE_STREAM_ENABLED
+    url: str = PRICE_STREAM_URL
+    heartbeat: float = PRICE_STREAM_HEARTBEAT
+    stale_timeout: float = PRICE_STREAM_STALE_TIMEOUT
+    debounce: float = PRICE_STREAM_DEBOUNCE
+    reconnect_max_delay: float = PRICE_STREAM_RECONNECT_MAX_DELAY
+    queue_size: int = PRICE_STREAM_QUEUE_SIZE
+
+    @field_validator('heartbeat', 'stale_timeout', 'debounce', 'reconnect_max_delay', 'queue_size')
+    def validate_positive(cls, v):
+        if v <= 0:
+            raise ValueError("Must be positive")
+        return v
+
+
+class CatImageConfig(BaseModel):
+    pool_size: int = CAT_IMAGE_POOL_SIZE
+    low_water_mark: int = CAT_IMAGE_POOL_LOW_WATER_MARK
+    batch_size: int = CAT_IMAGE_BATCH_SIZE
+    api_key: str = CAT_API_KEY
+    file_id_cache_size: int = CAT_FILE_ID_CACHE_SIZE
+    file_id_cache_file: str = CAT_FILE_ID_CACHE_FILE
+
+    @field_validator('pool_size', 'batch_size', 'file_id_cache_size')
+    def validate_positive_int(cls, v):
+        if v <= 0:
+            raise ValueError("Must be a positive integer")
+        return v
+
+
+class PriceStorageConfig(BaseModel):
+    enabled: bool = PRICE_STORAGE_ENABLED
+    flush_interval: int = PRICE_STORAGE_FLUSH_INTERVAL
+    max_buffered_ticks: int = PRICE_STORAGE_MAX_BUFFERED_TICKS
+    ticks_retention_days: int = PRICE_STORAGE_TICKS_RETENTION_DAYS
+    partitions_ahead: int = PRICE_STORAGE_PARTITIONS_AHEAD
+    rollup_interval: int = PRICE_STORAGE_ROLLUP_INTERVAL
+    minute_rollup_retention_days: int = PRICE_STORAGE_MINUTE_ROLLUP_RETENTION_DAYS
+    maintenance_lock_key: int = PRICE_STORAGE_MAINTENANCE_LOCK_KEY
+
+    @field_validator('flush_interval', 'max_buffered_ticks', 'ticks_retention_days', 'partitions_ahead',
+                     'rollup_interval', 'minute_rollup_retention_days')
+    def validate_positive_int(cls, v):
+        if v <= 0:
+            raise ValueError("Must be a positive integer")
+        return v
 
 
 class Settings(BaseSettings):
     run: RunConfig = RunConfig()
     db: DBConfig = DBConfig()
     http_client: HTTPClientConfig = HTTPClientConfig()
+    price_service: PriceServiceConfig = PriceServiceConfig()
+    price_monitor: PriceMonitorConfig = PriceMonitorConfig()
+    price_stream: PriceStreamConfig = PriceStreamConfig()
+    price_storage: PriceStorageConfig = PriceStorageConfig()
+    cat_image: CatImageConfig = CatImageConfig()
 
 
 settings = Settings()
@@ -3,13 +3,19 @@ __all__ = [
     "TGUser",
     "db_helper",
     "http_helper",
+    "UpstreamSchemaError",
     "Coin",
     "UserCoinAssociation",
+    "price_ticks",
+    "price_ohlc_1m",
+    "price_ohlc_1h",
+    "price_ohlc_1d",
 ]
 
 from .base import Base
 from .tg_user import TGUser
 from .db_helper import db_helper
-from .http_helper import http_helper
+from .http_helper import http_helper, UpstreamSchemaError
 from .crypto_coin import Coin
 from .tg_user_coin_association import UserCoinAssociation
+from .price_tick import price_ticks, price_ohlc_1m, price_ohlc_1h, price_ohlc_1d
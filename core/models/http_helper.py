@@ -1,16 +1,260 @@
 import asyncio
+import random
 import time
-from typing import List
+from email.utils import parsedate_to_datetime
+from collections import deque, OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Deque, Dict, Set, Type, TypeVar
 import aiohttp
+import msgspec
 from asyncio import Lock
+from yarl import URL
 
 from core import settings, logger
 
+# Statuses after which a request is retried with backoff
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+T = TypeVar("T")
+
+
+class UpstreamSchemaError(Exception):
+    """Upstream response body does not match the expected schema."""
+
+    def __init__(self, url: str, error: Exception):
+        super().__init__(f"Unexpected response schema from {url}: {error}")
+        self.url = url
+        self.error = error
+
+
+class TokenBucket:
+    """
+    Token bucket limiting the request rate to one upstream host.
+
+    Waiters are served in FIFO order. pause_until() blocks the bucket entirely, e.g. for a Retry-After.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = Lock()
+
+    def pause_until(self, resume_at: float) -> None:
+        self.paused_until = max(self.paused_until, resume_at)
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After header in seconds, it may be given as a number of seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class ConnectionStats:
+    """Connection reuse counters of one upstream host."""
+    requests: int = 0
+    connections_created: int = 0
+    connections_reused: int = 0
+    dns_cache_hits: int = 0
+    dns_cache_misses: int = 0
+
+    @property
+    def reuse_ratio(self) -> float:
+        connections = self.connections_created + self.connections_reused
+        return self.connections_reused / connections if connections else 0.0
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    expires_at: float
+    etag: str | None
+    last_modified: str | None
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+
+class ResponseCache:
+    """
+    HTTP response cache with conditional revalidation, bounded by the total size of cached bodies.
+
+    Responses are stored when they allow it (no no-store, no Vary) and have a lifetime
+    (Cache-Control max-age / Expires) or a validator (ETag / Last-Modified). Expired entries
+    with validators are revalidated with If-None-Match / If-Modified-Since, a 304 reuses the body.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(method: str, url: str, params: dict | None) -> str:
+        return f"{method} {URL(url).update_query(params) if params else URL(url)}"
+
+    def get(self, key: str) -> CachedResponse | None:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def conditional_headers(self, entry: CachedResponse) -> Dict[str, str]:
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    @staticmethod
+    def lifetime(headers) -> float | None:
+        """Seconds the response may be served without revalidation, None if it must not be stored."""
+        directives = {}
+        for directive in headers.get("Cache-Control", "").split(","):
+            name, _, value = directive.strip().partition("=")
+            if name:
+                directives[name.lower()] = value.strip('"')
+
+        if "no-store" in directives or headers.get("Vary", "").strip() not in ("", "Accept-Encoding"):
+            return None
+        if "no-cache" in directives:
+            return 0.0
+        for name in ("max-age", "s-maxage"):
+            if directives.get(name, "").isdigit():
+                return max(0.0, float(directives[name]) - float(headers.get("Age", "0") or 0))
+        if "Expires" in headers:
+            try:
+                return max(0.0, parsedate_to_datetime(headers["Expires"]).timestamp() - time.time())
+            except (TypeError, ValueError):
+                return 0.0
+        return 0.0
+
+    def store(self, key: str, body: bytes, headers) -> None:
+        lifetime = self.lifetime(headers)
+        etag, last_modified = headers.get("ETag"), headers.get("Last-Modified")
+        if lifetime is None or (not lifetime and not etag and not last_modified) or len(body) > self.max_bytes:
+            return
+
+        self.discard(key)
+        entry = self.entries[key] = CachedResponse(body=body, expires_at=time.monotonic() + lifetime,
+                                                   etag=etag, last_modified=last_modified)
+        self.total_bytes += entry.size
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= evicted.size
+
+    def refresh(self, key: str, entry: CachedResponse, headers) -> None:
+        """Extend the lifetime of an entry after a 304 Not Modified."""
+        lifetime = self.lifetime(headers)
+        if lifetime is None:
+            self.discard(key)
+            return
+        entry.expires_at = time.monotonic() + lifetime
+        entry.etag = headers.get("ETag", entry.etag)
+        entry.last_modified = headers.get("Last-Modified", entry.last_modified)
+
+    def discard(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+
+
+class CircuitOpenError(Exception):
+    """Requests to a host are rejected without being sent while its circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker of one upstream host.
+
+    Closed: requests pass and failures are counted. Open (failure_threshold consecutive failures):
+    requests fail fast for reset_timeout seconds. Half-open: one probe request passes, its success
+    closes the circuit and its failure opens it again.
+    """
+
+    def __init__(self, host: str, failure_threshold: int = settings.http_client.circuit_failure_threshold,
+                 reset_timeout: float = settings.http_client.circuit_reset_timeout):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self.opened_at < self.reset_timeout else "half-open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open" or self.probe_in_flight:
+            return False
+        self.probe_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("Circuit for %s closed.", self.host)
+        self.failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.probe_in_flight or (self.opened_at is None and self.failures >= self.failure_threshold):
+            logger.warning("Circuit for %s opened after %s failures.", self.host, self.failures)
+            self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """The request was cancelled before it had a result, let another probe through."""
+        self.probe_in_flight = False
+
+
+class ClientPoolTimeout(asyncio.TimeoutError):
+    """No pooled client became available within the acquisition timeout."""
+
 
 class Client:
     def __init__(self, session: aiohttp.ClientSession):
         self.session = session
-        self.is_busy = False
         self.last_used = time.time()
 
     async def request(self, *args, **kwargs) -> aiohttp.ClientResponse:
@@ -32,74 +276,415 @@ class Client:
 
 
 class ClientManager:
+    """
+    Outbound HTTP for every upstream.
+
+    With shared_sessions every host gets one long-lived session whose TCPConnector keeps connections
+    (and TLS sessions) alive and caches DNS, so steady-state requests never reconnect.
+
+    Otherwise requests go through a pool of at most max_keepalive_connections clients. Idle clients
+    wait in a deque and callers waiting for one in a FIFO deque of futures: a released client is
+    handed straight to the oldest waiter, so acquisition is O(1) and fair. Clients idle for longer
+    than client_timeout are evicted and their sessions closed.
+    """
+
     def __init__(self, client_timeout=settings.http_client.timeout,
-                 max_keepalive_connections=settings.http_client.max_keepalive_connections):
-        self.clients: List[Client] = []
+                 max_keepalive_connections=settings.http_client.max_keepalive_connections,
+                 rate_limits=settings.http_client.rate_limits, max_retries=settings.http_client.max_retries,
+                 backoff_base=settings.http_client.backoff_base, backoff_max=settings.http_client.backoff_max,
+                 acquire_timeout=settings.http_client.acquire_timeout,
+                 shared_sessions=settings.http_client.shared_sessions,
+                 response_cache_bytes=settings.http_client.response_cache_bytes,
+                 max_stale=settings.http_client.max_stale,
+                 request_timeout=settings.http_client.request_timeout, hedge_delay=settings.http_client.hedge_delay):
+        self.idle: Deque[Client] = deque()
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.in_use: Set[Client] = set()
         self.max_clients = max_keepalive_connections
         self.client_timeout = client_timeout
-        self.lock = Lock()  # For thread-safety
+        self.request_timeout = request_timeout
+        self.acquire_timeout = acquire_timeout
+        self.hedge_delay = hedge_delay
+        self.circuit_breakers: Dict[str, CircuitBreaker] = {}
+        self.rate_limiters: Dict[str, TokenBucket] = {
+            host: TokenBucket(rate, capacity) for host, (rate, capacity) in rate_limits.items()
+        }
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.shared_sessions = shared_sessions
+        self.host_sessions: Dict[str, aiohttp.ClientSession] = {}
+        self.connection_stats: Dict[str, ConnectionStats] = {}
+        self.response_cache = ResponseCache(response_cache_bytes) if response_cache_bytes else None
+        self.max_stale = max_stale
         self.cleanup_task = None
         self.is_shutting_down = False
 
+    @property
+    def size(self) -> int:
+        return len(self.idle) + len(self.in_use)
+
     async def start(self):
         """Initialize the cleanup task."""
         if self.cleanup_task is None:
             self.cleanup_task = asyncio.create_task(self.periodic_cleanup())
 
     async def periodic_cleanup(self) -> None:
-        """Periodically clean up inactive clients."""
+        """Periodically clean up inactive clients and report connection reuse."""
         while not self.is_shutting_down:
             await asyncio.sleep(60)
             await self.cleanup_inactive_clients()
+            for host, stats in self.connection_stats.items():
+                logger.info("HTTP %s: %s requests, %s connections created, %s reused (%.0f%%), DNS cache %s/%s hits.",
+                            host, stats.requests, stats.connections_created, stats.connections_reused,
+                            stats.reuse_ratio * 100, stats.dns_cache_hits,
+                            stats.dns_cache_hits + stats.dns_cache_misses)
+            if self.response_cache:
+                logger.info("HTTP response cache: %s hits, %s revalidated, %s misses, %s entries, %s bytes.",
+                            self.response_cache.hits, self.response_cache.revalidations, self.response_cache.misses,
+                            len(self.response_cache.entries), self.response_cache.total_bytes)
+
+    def trace_config(self, host: str) -> aiohttp.TraceConfig:
+        stats = self.connection_stats.setdefault(host, ConnectionStats())
+
+        def count(field: str):
+            async def handler(session, context, params):
+                setattr(stats, field, getattr(stats, field) + 1)
+            return handler
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(count("requests"))
+        trace_config.on_connection_create_end.append(count("connections_created"))
+        trace_config.on_connection_reuseconn.append(count("connections_reused"))
+        trace_config.on_dns_cache_hit.append(count("dns_cache_hits"))
+        trace_config.on_dns_cache_miss.append(count("dns_cache_misses"))
+
+        def mark_queued(queued: bool):
+            async def handler(session, context, params):
+                if context.trace_request_ctx is not None:
+                    context.trace_request_ctx["queued"] = queued
+            return handler
+
+        # dispatch() tells a timeout while waiting for a free connection from an upstream timeout
+        trace_config.on_connection_queued_start.append(mark_queued(True))
+        trace_config.on_connection_queued_end.append(mark_queued(False))
+        return trace_config
+
+    def session_for(self, host: str) -> aiohttp.ClientSession:
+        """Shared session of an upstream host, created on first use."""
+        session = self.host_sessions.get(host)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=settings.http_client.connector_limit,
+                limit_per_host=settings.http_client.connector_limit_per_host,
+                ttl_dns_cache=settings.http_client.dns_cache_ttl,
+                keepalive_timeout=settings.http_client.keepalive_timeout,
+            )
+            session = self.host_sessions[host] = aiohttp.ClientSession(
+                connector=connector,
+                # Waiting for a free connection of the connector counts towards the connect timeout
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout, connect=self.acquire_timeout),
+                trace_configs=[self.trace_config(host)],
+            )
+        return session
 
     async def cleanup_inactive_clients(self) -> None:
-        """Remove inactive clients from the pool."""
-        async with self.lock:
-            current_time = time.time()
-            self.clients = [client for client in self.clients
-                            if client.is_busy or (current_time - client.last_used < self.client_timeout)]
-            logger.info(f"Cleanup completed. %s clients remaining.", len(self.clients))
+        """Evict idle clients unused for client_timeout and close their sessions."""
+        current_time = time.time()
+        expired = [client for client in self.idle if current_time - client.last_used >= self.client_timeout]
+        if not expired:
+            return
+        self.idle = deque(client for client in self.idle if client not in expired)
+        for client in expired:
+            await client.session.close()
+        logger.info("Cleanup completed, %s clients evicted, %s remaining.", len(expired), self.size)
 
-    async def get_client(self) -> Client:
+    def create_client(self) -> Client:
+        return Client(aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.request_timeout)))
+
+    async def acquire(self, timeout: float | None = None) -> Client:
         """
-        Get an available client from the pool. If none available and we haven't reached the limit, create a new one.
+        Take an idle client, create one below the limit or wait in line for a released one.
 
-        :return: An available client
+        :param timeout: Seconds to wait, settings.http_client.acquire_timeout by default
+        :raise ClientPoolTimeout: When no client became available in time
         """
-        async with self.lock:
-            current_time = time.time()
-            # Check for available non-busy clients
-            available_clients = [client for client in self.clients if not client.is_busy]
-            logger.info(f"Cleanup completed. %s clients remaining.", len(available_clients))
-
-            if available_clients:
-                client = available_clients[0]
-                # Mark the client as busy
-                client.is_busy = True
-                client.last_used = current_time
-                return client
-
-            # If no available clients and we haven't reached the limit, create a new one
-            if len(self.clients) < self.max_clients:
-                new_client = Client(aiohttp.ClientSession(
-                    timeout=aiohttp.ClientTimeout(total=self.client_timeout)
-                ))
-                # Mark the new client as busy
-                new_client.is_busy = True
-                new_client.last_used = current_time
-                self.clients.append(new_client)
-                return new_client
-
-            # If we've reached the limit, wait for an available client
-            logger.warning("All clients busy. Waiting for an available client.")
-            await asyncio.sleep(1)
-            return await self.get_client()
-
-    async def release_client(self, client: Client):
-        """Release a client, make it not busy anymore."""
-        async with self.lock:
-            if client in self.clients:
-                client.is_busy = False
+        if self.idle:
+            client = self.idle.popleft()
+        elif self.size < self.max_clients:
+            client = self.create_client()
+        else:
+            timeout = self.acquire_timeout if timeout is None else timeout
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                # Handed over by release(), already accounted as in use
+                return await asyncio.wait_for(waiter, timeout)
+            except BaseException as e:
+                if waiter.done() and not waiter.cancelled():
+                    # Handed over just as we gave up: pass it on
+                    self.release(waiter.result())
+                elif waiter in self.waiters:
+                    self.waiters.remove(waiter)
+                if isinstance(e, asyncio.TimeoutError):
+                    raise ClientPoolTimeout(f"No HTTP client available within {timeout}s") from e
+                raise
+
+        self.in_use.add(client)
+        return client
+
+    def release(self, client: Client) -> None:
+        """Return a client: hand it to the oldest waiter or put it back to the idle clients."""
+        client.last_used = time.time()
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(client)
+                return
+
+        self.in_use.discard(client)
+        if client.session.closed or self.is_shutting_down:
+            return
+        self.idle.append(client)
+
+    @asynccontextmanager
+    async def client(self, timeout: float | None = None) -> AsyncIterator[Client]:
+        """
+        Borrow a pooled client: async with http_helper.client() as client: ...
+
+        :param timeout: Acquisition timeout in seconds, settings.http_client.acquire_timeout by default
+        """
+        client = await self.acquire(timeout)
+        try:
+            yield client
+        finally:
+            self.release(client)
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def circuit_breaker(self, host: str) -> CircuitBreaker:
+        breaker = self.circuit_breakers.get(host)
+        if breaker is None:
+            breaker = self.circuit_breakers[host] = CircuitBreaker(host)
+        return breaker
+
+    async def send(self, method: str, url: str, host: str, hedged: bool = False,
+                   **kwargs) -> aiohttp.ClientResponse:
+        """
+        Send one attempt through the host's circuit breaker and rate limiter.
+
+        A hedged attempt is one logical request: it takes one rate limit token and records one
+        breaker result, however many copies of it were sent.
+
+        Only upstream errors (5xx responses, request timeouts, connection errors) count as breaker
+        failures, a request that timed out waiting for a local client or connection was never sent.
+
+        :raise CircuitOpenError: When the host's circuit is open
+        """
+        breaker = self.circuit_breaker(host)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit for {host} is open, request to {url} rejected")
+
+        try:
+            rate_limiter = self.rate_limiters.get(host)
+            if rate_limiter:
+                await rate_limiter.acquire()
+
+            dispatch = self.dispatch_hedged if hedged else self.dispatch
+            response = await dispatch(method, url, host, **kwargs)
+        except ClientPoolTimeout:
+            # Local saturation says nothing about the host
+            breaker.release_probe()
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.release_probe()
+            raise
+
+        if response.status >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    async def dispatch(self, method: str, url: str, host: str, **kwargs) -> aiohttp.ClientResponse:
+        if self.shared_sessions:
+            wait = {"queued": False}
+            try:
+                return await self.session_for(host).request(method, url, trace_request_ctx=wait, **kwargs)
+            except asyncio.TimeoutError as e:
+                if wait["queued"]:
+                    raise ClientPoolTimeout(f"No connection to {host} available within {self.acquire_timeout}s") from e
+                raise
+        async with self.client() as client:
+            return await client.request(method, url, **kwargs)
+
+    async def dispatch_hedged(self, method: str, url: str, host: str, **kwargs) -> aiohttp.ClientResponse:
+        """
+        Dispatch a request and, when it is not answered within hedge_delay, one more copy of it.
+        The first successful response wins, the other copy is cancelled or released.
+        """
+        attempts = {asyncio.create_task(self.dispatch(method, url, host, **kwargs))}
+        done, _ = await asyncio.wait(attempts, timeout=self.hedge_delay)
+        if not done:
+            logger.info("No response from %s within %ss, sending a hedged request.", host, self.hedge_delay)
+            attempts.add(asyncio.create_task(self.dispatch(method, url, host, **kwargs)))
+
+        response, error = None, None
+        try:
+            while attempts and response is None:
+                done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is not None:
+                        # An upstream error of one copy says more about the host than a local timeout of the other
+                        if error is None or isinstance(error, ClientPoolTimeout):
+                            error = attempt.exception()
+                    elif response is None:
+                        response = attempt.result()
+                    else:
+                        attempt.result().release()
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+                # A loser that completes anyway must give its connection back
+                attempt.add_done_callback(
+                    lambda task: task.cancelled() or task.exception() or task.result().release())
+
+        if response is None:
+            raise error
+        return response
+
+    async def request(self, method: str, url: str, max_retries: int | None = None,
+                      **kwargs) -> aiohttp.ClientResponse:
+        """
+        Make a rate-limited HTTP request through the host's circuit breaker.
+
+        Waits for the host's token bucket, retries connection errors and 429/5xx responses with
+        exponential jittered backoff, and honours Retry-After by pausing the whole host. A Retry-After
+        above backoff_max is not waited for: the response is returned right away and the host is paused
+        for backoff_max only.
+        GET requests are hedged when hedge_delay is set.
+
+        :param method: HTTP method
+        :param url: Request URL
+        :param max_retries: Retries after the first attempt, settings.http_client.max_retries by default
+        :param kwargs: Keyword arguments for aiohttp.ClientSession.request
+        :return: HTTP response, the last one if retries are exhausted or Retry-After is too long
+        :raise CircuitOpenError: When the host's circuit is open, without waiting for the upstream
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        host = URL(url).host
+        rate_limiter = self.rate_limiters.get(host)
+        hedged = bool(self.hedge_delay) and method == 'GET'
+
+        for attempt in range(max_retries + 1):
+            try:
+                response = await self.send(method, url, host, hedged, **kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == max_retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                logger.warning(f"Request to {url} failed (attempt {attempt + 1}/{max_retries + 1}), "
+                               f"retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                continue
+
+            if response.status not in RETRY_STATUSES or attempt == max_retries:
+                return response
+
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if rate_limiter and retry_after is not None:
+                # Every request to this host waits, not only the retried one
+                rate_limiter.pause_until(time.monotonic() + min(retry_after, self.backoff_max))
+            if retry_after is not None and retry_after > self.backoff_max:
+                # Not worth waiting for, the caller fails over or answers from its cache instead
+                logger.warning(f"Request to {url} returned {response.status} with Retry-After {retry_after:.0f}s "
+                               f"above {self.backoff_max:.0f}s, not retrying")
+                return response
+            delay = self.backoff_delay(attempt) if retry_after is None else retry_after
+            response.release()
+            logger.warning(f"Request to {url} returned {response.status} (attempt {attempt + 1}/{max_retries + 1}), "
+                           f"retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def get_json(self, url: str, decode_type: Type[T], method: str = 'GET', strict: bool = True,
+                       use_cache: bool = True, max_stale: float | None = None, revalidate: bool = False,
+                       **kwargs) -> T:
+        """
+        Make a request with request() and decode the JSON body straight into decode_type with msgspec.
+
+        GET responses go through the response cache: fresh entries are served without a request,
+        expired ones are revalidated and a 304 reuses the cached body. While the upstream fails,
+        a body expired at most max_stale seconds ago is served instead of the error.
+
+        :param url: Request URL
+        :param decode_type: msgspec-compatible type, e.g. a Struct or Dict[str, Struct] from core.schemas
+        :param method: HTTP method
+        :param strict: When False, numbers sent as strings are accepted (msgspec lax mode)
+        :param use_cache: Use the response cache, e.g. False for responses that differ on every call
+        :param max_stale: Seconds past expiry a cached body may be served on errors, settings.http_client.max_stale
+            by default; 0 lets errors propagate, e.g. for callers that fail over to another upstream
+        :param revalidate: Ask the upstream even when the cached body is still fresh (conditionally,
+            a 304 reuses it), e.g. for forced fetches that a Cache-Control max-age must not answer
+        :param kwargs: Keyword arguments for request()
+        :return: Decoded body
+        :raise UpstreamSchemaError: When the body is not valid JSON of the expected shape
+        """
+        body = await self.get_body(url, method, use_cache, max_stale, revalidate, **kwargs)
+        try:
+            return msgspec.json.decode(body, type=decode_type, strict=strict)
+        except (msgspec.ValidationError, msgspec.DecodeError) as e:
+            raise UpstreamSchemaError(url, e) from e
+
+    async def get_body(self, url: str, method: str, use_cache: bool, max_stale: float | None = None,
+                       revalidate: bool = False, **kwargs) -> bytes:
+        cache = self.response_cache if use_cache and method == 'GET' else None
+        max_stale = self.max_stale if max_stale is None else max_stale
+        if cache is None:
+            response = await self.request(method, url, **kwargs)
+            if response.status != 200:
+                response.release()
+                raise Exception(f"Unexpected status code: {response.status}")
+            return await response.read()
+
+        key = cache.key(method, url, kwargs.get("params"))
+        entry = cache.get(key)
+        if entry is not None and not revalidate and time.monotonic() < entry.expires_at:
+            cache.hits += 1
+            return entry.body
+
+        if entry is not None:
+            kwargs["headers"] = {**cache.conditional_headers(entry), **kwargs.get("headers", {})}
+        # Upstream is degraded: a body expired not too long ago beats no answer
+        stale = entry if entry is not None and time.monotonic() - entry.expires_at <= max_stale else None
+        try:
+            response = await self.request(method, url, **kwargs)
+        except (CircuitOpenError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if stale is None:
+                raise
+            logger.warning(f"Serving a stale cached response for {url}: {e}")
+            return stale.body
+
+        if response.status == 304 and entry is not None:
+            response.release()
+            cache.revalidations += 1
+            cache.refresh(key, entry, response.headers)
+            return entry.body
+        if response.status != 200:
+            response.release()
+            if response.status >= 500 and stale is not None:
+                logger.warning(f"Serving a stale cached response for {url}: status {response.status}")
+                return stale.body
+            raise Exception(f"Unexpected status code: {response.status}")
+
+        cache.misses += 1
+        body = await response.read()
+        cache.store(key, body, response.headers)
+        return body
 
     async def dispose_all_clients(self) -> None:
         """Dispose all clients."""
@@ -111,10 +696,16 @@ class ClientManager:
             except asyncio.CancelledError:
                 pass
 
-        async with self.lock:
-            for client in self.clients:
-                await client.session.close()
-            self.clients.clear()
+        for waiter in self.waiters:
+            waiter.cancel()
+        self.waiters.clear()
+        for client in [*self.idle, *self.in_use]:
+            await client.session.close()
+        self.idle.clear()
+        self.in_use.clear()
+        for session in self.host_sessions.values():
+            await session.close()
+        self.host_sessions.clear()
         logger.info("All clients disposed.")
 
 
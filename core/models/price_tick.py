@@ -0,0 +1,37 @@
+from sqlalchemy import Table, Column, String, Float, Integer, DateTime, Index, PrimaryKeyConstraint
+
+from .base import metadata
+
+# Raw prices of every fetch. Range-partitioned by day on ts, the partitions are created ahead and
+# dropped after the retention period by PriceStorageMaintenance. The table has no UUID / audit
+# columns of Base on purpose: it only grows and is read by time ranges.
+price_ticks = Table(
+    "price_ticks",
+    metadata,
+    Column("coin_id_for_price_getter", String, nullable=False),
+    Column("ts", DateTime(timezone=True), nullable=False),
+    Column("price", Float, nullable=False),
+    Index("ix_price_ticks_ts", "ts", postgresql_using="brin"),
+    postgresql_partition_by="RANGE (ts)",
+)
+
+
+def _ohlc_table(name: str) -> Table:
+    return Table(
+        name,
+        metadata,
+        Column("coin_id_for_price_getter", String, nullable=False),
+        Column("bucket", DateTime(timezone=True), nullable=False),
+        Column("open", Float, nullable=False),
+        Column("high", Float, nullable=False),
+        Column("low", Float, nullable=False),
+        Column("close", Float, nullable=False),
+        Column("ticks", Integer, nullable=False),
+        PrimaryKeyConstraint("coin_id_for_price_getter", "bucket"),
+    )
+
+
+# OHLC rollups, each one is built from the previous level
+price_ohlc_1m = _ohlc_table("price_ohlc_1m")
+price_ohlc_1h = _ohlc_table("price_ohlc_1h")
+price_ohlc_1d = _ohlc_table("price_ohlc_1d")
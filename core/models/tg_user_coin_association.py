@@ -1,4 +1,6 @@
-from sqlalchemy import ForeignKey, Float
+from datetime import datetime
+
+from sqlalchemy import ForeignKey, Float, Boolean, DateTime, true
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .base import Base
 from .tg_user import TGUser
@@ -19,6 +21,13 @@ class UserCoinAssociation(Base):
 
     saved_rate_to_compare: Mapped[float] = mapped_column(Float, nullable=True)
 
+    # Alert hysteresis: a min/max alert fires once when its threshold is met and is re-armed
+    # only after the price leaves the threshold by the re-arm band
+    min_alert_armed: Mapped[bool] = mapped_column(Boolean, default=True, server_default=true(), nullable=False)
+    max_alert_armed: Mapped[bool] = mapped_column(Boolean, default=True, server_default=true(), nullable=False)
+    last_alert_price: Mapped[float] = mapped_column(Float, nullable=True)
+    last_alert_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+
     user: Mapped["TGUser"] = relationship(back_populates="coin_associations")
     coin: Mapped["Coin"] = relationship(back_populates="user_associations")
 
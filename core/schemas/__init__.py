@@ -0,0 +1,12 @@
+__all__ = [
+    "CoinGeckoPrice",
+    "CoinGeckoSimplePrice",
+    "CoinCapAsset",
+    "CoinCapAssets",
+    "CatImage",
+    "CatImages",
+    "StreamPrices",
+]
+
+from .upstream import (CoinGeckoPrice, CoinGeckoSimplePrice, CoinCapAsset, CoinCapAssets, CatImage, CatImages,
+                       StreamPrices)
@@ -0,0 +1,43 @@
+"""
+Typed schemas of upstream JSON APIs, decoded with msgspec by ClientManager.get_json().
+
+Unknown fields are skipped without being materialized, missing required fields or wrong types
+raise UpstreamSchemaError, so a schema change of an upstream shows up in the logs instead of
+silently dropping prices.
+"""
+from typing import Dict, List
+
+import msgspec
+
+
+class CoinGeckoPrice(msgspec.Struct):
+    # Ids without a USD price come as {}, they must not fail the rest of the chunk
+    usd: float | None = None
+
+
+# /simple/price: {"bitcoin": {"usd": 63000.0}, ...}, unknown ids are absent
+CoinGeckoSimplePrice = Dict[str, CoinGeckoPrice]
+
+
+class CoinCapAsset(msgspec.Struct):
+    id: str
+    # Sent as a string, decoded with strict=False; null for assets without a market
+    price_usd: float | None = msgspec.field(name="priceUsd", default=None)
+
+
+class CoinCapAssets(msgspec.Struct):
+    data: List[CoinCapAsset]
+
+
+class CatImage(msgspec.Struct):
+    id: str
+    url: str
+    width: int | None = None
+    height: int | None = None
+
+
+# /v1/images/search
+CatImages = List[CatImage]
+
+# Price stream messages: {"bitcoin": "63000.12", ...}, decoded with strict=False
+StreamPrices = Dict[str, float]
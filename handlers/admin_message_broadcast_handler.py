@@ -10,6 +10,8 @@ from services import UserService
 
 router = Router()
 
+MAX_MESSAGE_LENGTH = 4096
+
 
 class AdminBroadcastStates(StatesGroup):
     WAITING_FOR_MESSAGE = State()
@@ -49,11 +51,8 @@ async def confirm_broadcast(message: types.Message, state: FSMContext):
     data = await state.get_data()
     broadcast_message = data['message']
 
-    async with db_helper.db_session() as session:
-        user_service = UserService(session)
-        all_users = await user_service.get_all_users()
-
-    for user in all_users:
+    # Users are read page by page, sending starts before the whole table is read
+    async for user in UserService.iter_users():
         try:
             if broadcast_message.content_type == ContentType.TEXT:
                 await message.bot.send_message(user.chat_id, broadcast_message.text)
@@ -128,19 +127,22 @@ async def list_users(message: types.Message):
         await message.answer("У вас нет прав для выполнения этой команды.")
         return
 
-    async with db_helper.db_session() as session:
-        user_service = UserService(session)
-        all_users = await user_service.get_all_users()
-
-    user_list = []
-    for user in all_users:
-        user_list.append(f"Username: {user.username or 'Не указан'}, Chat ID: {user.chat_id}")
+    header = "Список пользователей:\n\n"
+    users_text = ""
+    has_users = False
 
-    users_text = "\n".join(user_list)
+    # Send the list in message-sized chunks while users are still being read
+    async for user in UserService.iter_users():
+        has_users = True
+        line = f"Username: {user.username or 'Не указан'}, Chat ID: {user.chat_id}\n"
+        if len(header) + len(users_text) + len(line) > MAX_MESSAGE_LENGTH:
+            await message.answer(f"{header}{users_text}")
+            header, users_text = "", ""
+        users_text += line
 
     if users_text:
-        await message.answer(f"Список пользователей:\n\n{users_text}")
-    else:
+        await message.answer(f"{header}{users_text}")
+    elif not has_users:
         await message.answer("Список пользователей пуст.")
 
 
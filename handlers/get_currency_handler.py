@@ -1,16 +1,59 @@
+from datetime import datetime, timedelta, timezone
+
 from aiogram import Router, types
 from aiogram.filters import Command
+from core import settings, logger
 from core.models import db_helper
 from services import CoinService, CryptoPriceService, UserService
+from services.price_cache import price_cache
+from services.price_history import price_history
+from services.price_storage import PriceStorageService
 
 router = Router()
 
+# Window of the price change shown next to current prices
+PRICE_CHANGE_WINDOW = 60 * 60
+
+
+async def format_price_change(storage: PriceStorageService, coin_id: str, price) -> str:
+    """
+    Change over the last hour from the in-memory price history. Until the history reaches back that far
+    (e.g. right after a restart) the price of an hour ago is read from the stored ticks and rollups.
+
+    :param storage: Stored price history of the handler's session
+    :param coin_id: Id for the price provider
+    :param price: Price shown to the user, "N/A" when there is none
+    :return: Empty when neither history covers the window
+    """
+    change = price_history.percent_change(coin_id, PRICE_CHANGE_WINDOW)
+    if change is None and settings.price_storage.enabled and isinstance(price, (int, float)):
+        moment = datetime.now(timezone.utc) - timedelta(seconds=PRICE_CHANGE_WINDOW)
+        try:
+            baseline = await storage.get_price_at(coin_id, moment)
+        except Exception as e:
+            logger.warning(f"Failed to read the stored price of {coin_id}: {e}")
+            baseline = None
+        if baseline:
+            change = (price - baseline) / baseline * 100
+    if change is None:
+        return ""
+    return f" ({change:+.2f}% за 1ч)"
+
+
+def format_price_age(coin_id: str) -> str:
+    """Marker for prices served stale (e.g. from the warm-start snapshot) while they are being refreshed."""
+    age = price_cache.age(coin_id)
+    if age is None or age <= settings.price_service.cache_ttl:
+        return ""
+    return f" [данные {int(age // 60)} мин назад]"
+
 
 @router.message(Command("all_prices"))
 async def get_all_prices(message: types.Message):
     async with db_helper.db_session() as session:
         coin_service = CoinService(session)
         price_service = CryptoPriceService()
+        storage = PriceStorageService(session)
 
         all_coins = await coin_service.get_all_active_coins()
         coin_ids = [coin.coin_id_for_price_getter for coin in all_coins if coin.coin_id_for_price_getter]
@@ -19,7 +62,7 @@ async def get_all_prices(message: types.Message):
             await message.answer("В системе нет активных монет с идентификаторами для получения цен.")
             return
 
-        all_prices = await price_service.get_crypto_prices(coin_ids)
+        all_prices = await price_service.get_crypto_prices(coin_ids, allow_stale=True)
 
         if not all_prices:
             await message.answer("Не удалось получить текущие курсы. Попробуйте позже.")
@@ -29,7 +72,8 @@ async def get_all_prices(message: types.Message):
         for coin in all_coins:
             if coin.coin_id_for_price_getter:
                 price = all_prices.get(str(coin.coin_id_for_price_getter), "N/A")
-                response += f"{coin.code}: ${price}\n"
+                change = await format_price_change(storage, coin.coin_id_for_price_getter, price)
+                response += f"{coin.code}: ${price}{change}{format_price_age(coin.coin_id_for_price_getter)}\n"
             else:
                 response += f"{coin.code}: Цена недоступна\n"
 
@@ -41,6 +85,7 @@ async def get_portfolio_prices(message: types.Message):
     async with db_helper.db_session() as session:
         user_service = UserService(session)
         price_service = CryptoPriceService()
+        storage = PriceStorageService(session)
 
         user = await user_service.get_user(message.from_user.id)
         if not user:
@@ -53,12 +98,13 @@ async def get_portfolio_prices(message: types.Message):
             return
 
         coin_ids = [coin.coin_id_for_price_getter for coin, _ in user_coins if coin.coin_id_for_price_getter]
-        prices = await price_service.get_crypto_prices(coin_ids)
+        prices = await price_service.get_crypto_prices(coin_ids, allow_stale=True)
 
         response = "Текущие курсы монет в вашем портфолио:\n\n"
         for coin, association in user_coins:
             price = prices.get(coin.coin_id_for_price_getter, "N/A")
-            response += f"{coin.code}: ${price}\n"
+            change = await format_price_change(storage, coin.coin_id_for_price_getter, price)
+            response += f"{coin.code}: ${price}{change}{format_price_age(coin.coin_id_for_price_getter)}\n"
             if association.min_rate:
                 response += f"  Мин. курс: ${association.min_rate}\n"
             if association.max_rate:
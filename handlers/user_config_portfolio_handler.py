@@ -7,7 +7,7 @@ from core import logger
 from core.models import db_helper
 from handlers import main_keyboard
 from handlers.keyboards import coin_management_keyboard
-from services import CoinService, CryptoPriceService, UserService
+from services import CoinService, CryptoPriceService, UserService, price_threshold_index
 
 router = Router()
 
@@ -60,7 +60,7 @@ async def add_coin(message: types.Message, state: FSMContext):
 
             price_service = CryptoPriceService()
             coin_ids = [coin.coin_id_for_price_getter for coin in all_coins if coin.coin_id_for_price_getter]
-            current_prices = await price_service.get_crypto_prices(coin_ids)
+            current_prices = await price_service.get_crypto_prices(coin_ids, allow_stale=True)
 
             sorted_coins = sorted(all_coins, key=lambda c: c.code)
             coin_list = []
@@ -133,6 +133,7 @@ async def replace_coin(callback_query: types.CallbackQuery, state: FSMContext):
             if not deleted:
                 await callback_query.answer("Не удалось удалить монету. Попробуйте еще раз.")
                 return
+            price_threshold_index.discard_user_coin(user.chat_id, coin_id)
 
             coin_service = CoinService(session)
             coin = await coin_service.get_coin_by_id(coin_id)
@@ -271,13 +272,24 @@ async def process_new_value(message: types.Message, state: FSMContext):
 
     async with db_helper.db_session() as session:
         try:
+            changes = {editing_param: new_value}
+            # A new threshold starts armed, even if the old one already fired
+            if editing_param == "min_rate":
+                changes["min_alert_armed"] = True
+            elif editing_param == "max_rate":
+                changes["max_alert_armed"] = True
+
             user_service = UserService(session)
-            await user_service.update_user_coin(
+            updated = await user_service.update_user_coin(
                 message.from_user.id,
                 selected_coin.id,
                 association.id,
-                **{editing_param: new_value}
+                **changes
             )
+            if updated:
+                for key, value in changes.items():
+                    setattr(association, key, value)
+                price_threshold_index.upsert(association, message.from_user.id)
 
             await message.answer(f"Параметр {editing_param} для {selected_coin.code} успешно обновлен!",
                                  reply_markup=coin_management_keyboard)
@@ -302,7 +314,7 @@ async def save_user_coin(message: types.Message, state: FSMContext):
             current_prices = await price_service.get_crypto_prices([selected_coin.coin_id_for_price_getter])
             saved_rate_to_compare = current_prices.get(selected_coin.coin_id_for_price_getter)
 
-            await user_service.add_coin_to_user(
+            association = await user_service.add_coin_to_user(
                 user_id,
                 selected_coin.id,
                 min_rate=user_data.get('min_rate'),
@@ -311,6 +323,7 @@ async def save_user_coin(message: types.Message, state: FSMContext):
                 rate_percentage_declines=user_data.get('decline_percentage'),
                 saved_rate_to_compare=saved_rate_to_compare
             )
+            price_threshold_index.upsert(association, message.from_user.id)
 
             await message.answer(f"Монета {selected_coin.code} успешно добавлена!",
                                  reply_markup=coin_management_keyboard)
@@ -385,7 +398,7 @@ async def process_coin_deletion(message: types.Message, state: FSMContext):
 
     try:
         selected_index = int(message.text) - 1
-        selected_coin, _ = user_coins[selected_index]
+        selected_coin, association = user_coins[selected_index]
     except (ValueError, IndexError):
         await message.answer("Пожалуйста, введите корректный номер монеты.")
         return
@@ -396,6 +409,7 @@ async def process_coin_deletion(message: types.Message, state: FSMContext):
             deleted = await user_service.remove_coin_from_user(message.from_user.id, selected_coin.id)
 
             if deleted:
+                price_threshold_index.discard(association.id)
                 await message.answer(f"Монета {selected_coin.code} успешно удалена!",
                                      reply_markup=coin_management_keyboard)
             else:
@@ -419,7 +433,7 @@ async def list_user_coins(message: types.Message, state: FSMContext):
 
             price_service = CryptoPriceService()
             coin_ids = [coin.coin_id_for_price_getter for coin, _ in user_coins if coin.coin_id_for_price_getter]
-            current_prices = await price_service.get_crypto_prices(coin_ids)
+            current_prices = await price_service.get_crypto_prices(coin_ids, allow_stale=True)
 
             coin_list = []
             for i, (coin, association) in enumerate(user_coins, 1):
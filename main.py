@@ -5,9 +5,14 @@ from aiogram import Bot, Dispatcher
 from dotenv import load_dotenv
 import os
 
+from core import settings
 from core.models import http_helper
 from handlers import router as handlers_router
 from services import PriceMonitor
+from services.get_cat_image import cat_image_pool
+from services.price_snapshot import price_snapshot
+from services.price_storage import price_tick_writer, PriceStorageMaintenance
+from services.telegram_file_cache import cat_photo_file_ids
 
 logging.basicConfig(level=logging.INFO)
 load_dotenv(".env")
@@ -20,7 +25,7 @@ dp.include_router(handlers_router)
 
 
 async def start_price_monitor(bot):
-    price_monitor = PriceMonitor(bot, update_interval=300)  # Check every 5 minutes
+    price_monitor = PriceMonitor(bot)  # Interval from settings.price_monitor, 5 minutes by default
     await price_monitor.run()
 
 
@@ -29,20 +34,35 @@ async def main():
     bot = Bot(token=BOT_TOKEN)
 
     await http_helper.start()
-
-    # Start PriceMonitor in a separate task
-    price_monitor_task = asyncio.create_task(start_price_monitor(bot))
+    await cat_image_pool.start()
+    # Warm cache and history baseline from the previous run
+    price_snapshot.load(role="bot")
+    cat_photo_file_ids.load(role="bot")
+    await price_tick_writer.start()
+    price_storage_maintenance = PriceStorageMaintenance()
+    await price_storage_maintenance.start()
+
+    # Start PriceMonitor in a separate task, unless it runs in dedicated monitor_worker.py processes
+    price_monitor_task = None
+    if settings.price_monitor.embedded:
+        price_monitor_task = asyncio.create_task(start_price_monitor(bot))
 
     try:
         await dp.start_polling(bot)
     finally:
         # Cancel PriceMonitor task
-        price_monitor_task.cancel()
-        try:
-            await price_monitor_task
-        except asyncio.CancelledError:
-            pass
-
+        if price_monitor_task:
+            price_monitor_task.cancel()
+            try:
+                await price_monitor_task
+            except asyncio.CancelledError:
+                pass
+
+        await price_storage_maintenance.stop()
+        await price_tick_writer.stop()
+        await price_snapshot.stop()
+        await cat_image_pool.stop()
+        await cat_photo_file_ids.stop()
         await http_helper.dispose_all_clients()
         await bot.session.close()
 
@@ -0,0 +1,66 @@
+"""
+Standalone PriceMonitor worker.
+
+Run any number of these next to the bot (with PRICE_MONITOR_EMBEDDED=False for the polling process).
+Users are partitioned into settings.price_monitor.total_shards shards by chat_id, every worker claims
+shards through Postgres advisory locks, the shards are split evenly between the live workers and the
+shards of workers that die are taken over.
+"""
+import asyncio
+import logging
+
+from aiogram import Bot
+from dotenv import load_dotenv
+import os
+
+from core import settings
+from core.models import http_helper, db_helper
+from services import PriceMonitor
+from services.get_cat_image import cat_image_pool
+from services.price_snapshot import price_snapshot
+from services.price_storage import price_tick_writer, PriceStorageMaintenance
+from services.telegram_file_cache import cat_photo_file_ids
+from services.shard_lease import ShardLeaseManager
+
+logging.basicConfig(level=logging.INFO)
+load_dotenv(".env")
+
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+
+
+async def main():
+    if settings.price_monitor.embedded:
+        # The bot process would run its own monitor over all users and every alert would be sent twice
+        raise SystemExit("PRICE_MONITOR_EMBEDDED must be False when monitor_worker.py processes are deployed.")
+
+    logging.info("Starting the price monitor worker")
+    bot = Bot(token=BOT_TOKEN)
+
+    await http_helper.start()
+    await cat_image_pool.start()
+    # Warm cache and history baseline from the previous run
+    price_snapshot.load(role="worker")
+    cat_photo_file_ids.load(role="worker")
+    await price_tick_writer.start()
+    price_storage_maintenance = PriceStorageMaintenance()
+    await price_storage_maintenance.start()
+
+    shard_lease = ShardLeaseManager()
+    await shard_lease.start()
+
+    try:
+        await PriceMonitor(bot, shard_lease=shard_lease).run()
+    finally:
+        await shard_lease.stop()
+        await price_storage_maintenance.stop()
+        await price_tick_writer.stop()
+        await price_snapshot.stop()
+        await cat_image_pool.stop()
+        await cat_photo_file_ids.stop()
+        await http_helper.dispose_all_clients()
+        await bot.session.close()
+        await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
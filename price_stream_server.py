@@ -0,0 +1,64 @@
+"""
+Local stand-in for the CoinCap price websocket.
+
+Serves ws://<host>:<port>/prices?assets=bitcoin,ethereum and pushes {"<id>": "<price>", ...} messages with
+prices from LocalPriceProvider (the PRICE_LOCAL_* settings: a JSON replay file or a seeded random walk).
+Point the bot at it with PRICE_STREAM_ENABLED=True PRICE_STREAM_URL=ws://localhost:8765/prices.
+"""
+import argparse
+import asyncio
+import json
+import logging
+
+from aiohttp import web
+
+from services.price_providers import LocalPriceProvider
+
+logging.basicConfig(level=logging.INFO)
+
+
+async def prices_handler(request: web.Request) -> web.WebSocketResponse:
+    ws = web.WebSocketResponse(heartbeat=request.app["heartbeat"])
+    await ws.prepare(request)
+
+    coin_ids = [coin_id for coin_id in request.query.get("assets", "").split(",") if coin_id]
+    provider: LocalPriceProvider = request.app["provider"]
+    interval: float = request.app["interval"]
+    logging.info("Stream client subscribed to %s coins", len(coin_ids))
+
+    async def send_prices():
+        while not ws.closed:
+            prices = await provider.fetch_chunk(coin_ids)
+            # CoinCap sends prices as strings
+            await ws.send_str(json.dumps({coin_id: str(price) for coin_id, price in prices.items()}))
+            await asyncio.sleep(interval)
+
+    sender = asyncio.create_task(send_prices())
+    try:
+        # Reading is what answers pings and close frames of the client
+        async for _ in ws:
+            pass
+    finally:
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+    return ws
+
+
+def create_app(interval: float, heartbeat: float) -> web.Application:
+    app = web.Application()
+    app["provider"] = LocalPriceProvider()
+    app["interval"] = interval
+    app["heartbeat"] = heartbeat
+    app.router.add_get("/prices", prices_handler)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between price messages")
+    parser.add_argument("--heartbeat", type=float, default=20.0)
+    args = parser.parse_args()
+
+    web.run_app(create_app(args.interval, args.heartbeat), host=args.host, port=args.port)
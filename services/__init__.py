@@ -4,10 +4,12 @@ __all__ = [
     "CoinService",
     "CryptoPriceService",
     "PriceMonitor",
+    "price_threshold_index",
 ]
 
 from .tg_user import UserService
 from .get_cat_image import get_random_cat_image
 from .crypto_coin import CoinService
 from .crypto_coin_price import CryptoPriceService
+from .price_threshold_index import price_threshold_index
 from .price_monitoring_service import PriceMonitor
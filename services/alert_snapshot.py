@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Sequence, Tuple
+from uuid import UUID
+
+import numpy as np
+
+from core.models import Coin
+
+
+# (association_id, coin_id, chat_id, min_rate, max_rate, rate_percentage_growth, rate_percentage_declines,
+#  saved_rate_to_compare), e.g. UserService.get_alert_rule_rows()
+AlertRuleRow = Tuple[UUID, UUID, int, float | None, float | None, float | None, float | None, float | None]
+
+
+def _rule_column(values: Sequence[float | None]) -> np.ndarray:
+    # Same truthiness as PriceMonitor.check_price_conditions: None / 0 mean "not set"
+    column = np.array(values, dtype=np.float64)
+    column[column == 0] = np.nan
+    return column
+
+
+@dataclass
+class AlertEvaluation:
+    """Per-row results of one vectorized evaluation, aligned with the snapshot columns."""
+    price: np.ndarray
+    growth: np.ndarray
+    decline: np.ndarray
+    min_hit: np.ndarray
+    max_hit: np.ndarray
+    growth_hit: np.ndarray
+    decline_hit: np.ndarray
+
+
+class AlertSnapshot:
+    """
+    Columnar snapshot of user-coin associations.
+
+    Thresholds and baselines are float64 columns (NaN where a rule is not set), coins and chats
+    are integer columns, so a whole tick is evaluated in a handful of array operations.
+    PriceMonitor.check_price_conditions stays the scalar reference implementation.
+    """
+
+    def __init__(self, coins: List[Coin], coin_index: np.ndarray, chat_id: np.ndarray, min_rate: np.ndarray,
+                 max_rate: np.ndarray, rate_percentage_growth: np.ndarray, rate_percentage_declines: np.ndarray,
+                 saved_rate_to_compare: np.ndarray, association_ids: List[UUID]):
+        self.coins = coins
+        self.coin_index = coin_index
+        self.chat_id = chat_id
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate_percentage_growth = rate_percentage_growth
+        self.rate_percentage_declines = rate_percentage_declines
+        self.saved_rate_to_compare = saved_rate_to_compare
+        self.association_ids = association_ids
+
+    def __len__(self):
+        return len(self.association_ids)
+
+    @classmethod
+    def from_columns(cls, coins: Iterable[Coin], rows: Sequence[AlertRuleRow]) -> "AlertSnapshot":
+        """
+        Build a snapshot from plain column tuples, transposed into arrays without touching ORM objects.
+
+        :param coins: Coins the rows refer to, used for the notification texts
+        :param rows: Rule rows of these coins
+        """
+        coins = list(coins)
+        coin_positions: Dict[UUID, int] = {coin.id: position for position, coin in enumerate(coins)}
+        if not rows:
+            empty = np.empty(0, dtype=np.float64)
+            return cls(coins=coins, coin_index=np.empty(0, dtype=np.int32), chat_id=np.empty(0, dtype=np.int64),
+                       min_rate=empty, max_rate=empty, rate_percentage_growth=empty,
+                       rate_percentage_declines=empty, saved_rate_to_compare=empty, association_ids=[])
+
+        association_ids, coin_ids, chat_id, min_rate, max_rate, growth, declines, saved_rate = zip(*rows)
+        return cls(
+            coins=coins,
+            coin_index=np.array([coin_positions[coin_id] for coin_id in coin_ids], dtype=np.int32),
+            chat_id=np.array(chat_id, dtype=np.int64),
+            min_rate=_rule_column(min_rate),
+            max_rate=_rule_column(max_rate),
+            rate_percentage_growth=_rule_column(growth),
+            rate_percentage_declines=_rule_column(declines),
+            saved_rate_to_compare=_rule_column(saved_rate),
+            association_ids=list(association_ids),
+        )
+
+    def evaluate(self, current_prices: Dict[str, float]) -> AlertEvaluation:
+        """
+        Evaluate min/max/growth/decline rules of every row against the current prices.
+
+        :param current_prices: Prices keyed by coin_id_for_price_getter
+        :return: Per-row prices, percentage moves and hit masks; rows without a price never hit
+        """
+        coin_prices = np.array([current_prices.get(coin.coin_id_for_price_getter, np.nan) for coin in self.coins],
+                               dtype=np.float64)
+        price = coin_prices[self.coin_index] if len(self.coins) else np.empty(0, dtype=np.float64)
+
+        # NaN (missing price / rule not set) compares as False, so no explicit masking is needed
+        with np.errstate(invalid="ignore"):
+            growth = (price - self.saved_rate_to_compare) / self.saved_rate_to_compare * 100
+            decline = -growth
+            return AlertEvaluation(
+                price=price,
+                growth=growth,
+                decline=decline,
+                min_hit=price <= self.min_rate,
+                max_hit=price >= self.max_rate,
+                growth_hit=growth >= self.rate_percentage_growth,
+                decline_hit=decline >= self.rate_percentage_declines,
+            )
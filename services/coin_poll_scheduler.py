@@ -0,0 +1,102 @@
+import heapq
+import math
+import time
+from typing import Dict, Iterable, List, Tuple
+from uuid import UUID
+
+from core import settings
+
+
+class CoinPollScheduler:
+    """
+    Per-coin poll schedule kept in a heap of (next_poll_at, coin_id).
+
+    The poll interval of a coin shrinks with its recent volatility, the proximity of the nearest
+    user threshold and the number of watchers, and is clamped to [min_interval, max_interval].
+    """
+
+    def __init__(self, min_interval: float = settings.price_monitor.min_poll_interval,
+                 max_interval: float = settings.price_monitor.max_poll_interval,
+                 default_distance: float = 0.01, volatility_smoothing: float = 0.3, safety_factor: float = 0.5):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        # Relative distance assumed for coins without min/max thresholds (percentage rules only)
+        self.default_distance = default_distance
+        self.volatility_smoothing = volatility_smoothing
+        self.safety_factor = safety_factor
+
+        self.heap: List[Tuple[float, UUID]] = []
+        self.next_poll_at: Dict[UUID, float] = {}
+        # Coin.id -> smoothed relative price change per second
+        self.volatility: Dict[UUID, float] = {}
+
+    def sync(self, coin_ids: Iterable[UUID], now: float | None = None) -> None:
+        """Schedule new coins immediately and forget coins that are gone."""
+        now = time.monotonic() if now is None else now
+        coin_ids = set(coin_ids)
+        for coin_id in coin_ids - self.next_poll_at.keys():
+            self.schedule(coin_id, now)
+        for coin_id in self.next_poll_at.keys() - coin_ids:
+            # Heap entries of removed coins are skipped lazily in pop_due()
+            del self.next_poll_at[coin_id]
+            self.volatility.pop(coin_id, None)
+
+    def schedule(self, coin_id: UUID, poll_at: float) -> None:
+        self.next_poll_at[coin_id] = poll_at
+        heapq.heappush(self.heap, (poll_at, coin_id))
+
+    def pop_due(self, now: float | None = None) -> List[UUID]:
+        """Remove and return every coin whose poll time has come."""
+        now = time.monotonic() if now is None else now
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            poll_at, coin_id = heapq.heappop(self.heap)
+            if self.next_poll_at.get(coin_id) == poll_at:
+                del self.next_poll_at[coin_id]
+                due.append(coin_id)
+        return due
+
+    def seconds_until_next_poll(self, now: float | None = None) -> float:
+        now = time.monotonic() if now is None else now
+        while self.heap and self.next_poll_at.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        if not self.heap:
+            return self.max_interval
+        return max(0.0, self.heap[0][0] - now)
+
+    def observe(self, coin_id: UUID, rate: float) -> None:
+        """
+        Feed the latest price change into the volatility estimate of the coin.
+
+        :param rate: Relative price change per second, e.g. PriceHistory.change_rate()
+        """
+        previous = self.volatility.get(coin_id)
+        self.volatility[coin_id] = rate if previous is None else (
+                self.volatility_smoothing * rate + (1 - self.volatility_smoothing) * previous)
+
+    def interval_for(self, coin_id: UUID, threshold_distance: float | None, watchers: int) -> float:
+        """
+        :param threshold_distance: Relative distance from the current price to the nearest threshold
+        :param watchers: Number of users watching the coin
+        """
+        if not watchers:
+            return self.max_interval
+
+        volatility = self.volatility.get(coin_id)
+        if not volatility:
+            # Unknown or flat so far: poll fast until there is an estimate
+            interval = self.min_interval if volatility is None else self.max_interval
+        else:
+            distance = self.default_distance if threshold_distance is None else threshold_distance
+            # Expected time for the price to cover the distance, with a safety margin
+            interval = self.safety_factor * distance / volatility
+
+        interval /= 1 + math.log10(watchers)
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def reschedule(self, coin_id: UUID, threshold_distance: float | None, watchers: int,
+                   now: float | None = None) -> float:
+        now = time.monotonic() if now is None else now
+        interval = self.interval_for(coin_id, threshold_distance, watchers)
+        self.schedule(coin_id, now + interval)
+        return interval
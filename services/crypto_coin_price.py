@@ -1,37 +1,125 @@
 import asyncio
 import logging
+import time
+from dataclasses import dataclass
+from functools import partial
 from typing import Dict, List, Tuple
 from datetime import datetime, timedelta
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from core import logger
+from core import logger, settings
 from core.models import http_helper, db_helper
 from services import CoinService
+from services.price_cache import price_cache
+from services.price_history import price_history
+from services.price_snapshot import price_snapshot
+from services.price_storage import price_tick_writer
+from services.price_providers import PriceProvider, price_providers
+
+
+@dataclass
+class PriceChunkFailure:
+    coin_ids: List[str]
+    error: str
 
 
 class CryptoPriceService:
     def __init__(self, update_interval: int = 300):
         self.update_interval = update_interval
-        self.previous_prices: Dict[str, float] = {}
 
     @staticmethod
-    async def get_crypto_prices(coin_ids: List[str]) -> Dict[str, float]:
-        url = "https://api.coingecko.com/api/v3/simple/price"
-        params = {
-            "ids": ",".join(coin_ids),
-            "vs_currencies": "usd"
-        }
-        client = await http_helper.get_client()
-        try:
-            response = await client.request('GET', url, params=params)
-            data = await response.json()
-        except Exception as e:
-            logging.error(f"Request error: %s", e)
-        finally:
-            await http_helper.release_client(client)
-
-        return {coin_id: data[coin_id]["usd"] for coin_id in coin_ids if coin_id in data}
+    async def get_crypto_prices(coin_ids: List[str], max_age: float | None = None,
+                                allow_stale: bool = False) -> Dict[str, float]:
+        """
+        Get prices through the shared cache, concurrent misses share one upstream request.
+
+        :param coin_ids: Ids for the price provider (Coin.coin_id_for_price_getter)
+        :param max_age: Maximum age of cached prices in seconds, the cache TTL by default; 0 forces a fetch
+        :param allow_stale: Answer with expired prices (e.g. from the warm-start snapshot) right away
+            and refresh them in the background; price_cache.age() tells how old they are
+        :return: Prices keyed by id
+        """
+        stale_max_age = settings.price_service.snapshot_max_age if allow_stale else None
+        fetch = CryptoPriceService.fetch_crypto_prices
+        if max_age == 0:
+            # A forced fetch must reach the upstream: no cached HTTP responses, failed chunks go to the fallbacks
+            fetch = partial(fetch, fresh=True)
+        return await price_cache.get(coin_ids, fetch, max_age=max_age, stale_max_age=stale_max_age)
+
+    @staticmethod
+    async def fetch_crypto_prices(coin_ids: List[str], fresh: bool = False) -> Dict[str, float]:
+        """
+        Fetch prices from the configured provider, ids it could not price are retried on the fallbacks.
+        Prices of chunks that failed on every provider are missing from the result.
+        Every fetched price is recorded in the price history and buffered for price_ticks.
+
+        :param fresh: Forced fetch, see PriceProvider.fetch_chunk
+        """
+        prices: Dict[str, float] = {}
+        remaining = list(dict.fromkeys(coin_ids))
+        for provider in price_providers:
+            if not remaining:
+                break
+
+            provider_prices, failures = await CryptoPriceService.fetch_crypto_prices_batched(
+                provider, remaining, fresh)
+            for failure in failures:
+                logger.error(f"Failed to fetch prices for {len(failure.coin_ids)} coins "
+                             f"from {provider.name}: {failure.error}")
+            prices.update(provider_prices)
+            remaining = [coin_id for coin_id in remaining if coin_id not in prices]
+
+        CryptoPriceService.record_prices(prices)
+        return prices
+
+    @staticmethod
+    def record_prices(prices: Dict[str, float], update_cache: bool = False) -> None:
+        """
+        Record fetched or streamed prices in the price history and tick storage.
+
+        :param update_cache: Also refresh the shared cache, fetches through the cache update it themselves
+        """
+        fetched_at = time.time()
+        if update_cache:
+            price_cache.update(prices, fetched_at)
+        price_history.record(prices, fetched_at)
+        price_tick_writer.add(prices, fetched_at)
+        # Runs on the next loop iteration, after the cache has been updated with these prices
+        price_snapshot.schedule_save()
+
+    @staticmethod
+    async def fetch_crypto_prices_batched(provider: PriceProvider, coin_ids: List[str], fresh: bool = False,
+                                          concurrency: int = settings.price_service.fetch_concurrency
+                                          ) -> Tuple[Dict[str, float], List[PriceChunkFailure]]:
+        """
+        Split ids into provider-sized chunks and fetch them concurrently.
+
+        :param provider: Price provider to fetch from
+        :param coin_ids: Ids for the price provider
+        :param fresh: Forced fetch, see PriceProvider.fetch_chunk
+        :param concurrency: Maximum number of chunks fetched at the same time
+        :return: Merged prices of all successful chunks and the failed chunks
+        """
+        coin_ids = list(dict.fromkeys(coin_ids))
+        chunk_size = provider.chunk_size
+        chunks = [coin_ids[i:i + chunk_size] for i in range(0, len(coin_ids), chunk_size)]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch_chunk(chunk: List[str]) -> Dict[str, float]:
+            async with semaphore:
+                return await provider.fetch_chunk(chunk, fresh)
+
+        results = await asyncio.gather(*[fetch_chunk(chunk) for chunk in chunks], return_exceptions=True)
+
+        prices: Dict[str, float] = {}
+        failures: List[PriceChunkFailure] = []
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                failures.append(PriceChunkFailure(coin_ids=chunk, error=str(result) or repr(result)))
+            else:
+                prices.update(result)
+        return prices, failures
 
     async def update_prices(self):
         async for session in db_helper.session_getter():
@@ -45,13 +133,12 @@ class CryptoPriceService:
                 for coin in active_coins:
                     if coin.coin_id_for_price_getter in current_prices:
                         price = current_prices[coin.coin_id_for_price_getter]
-                        previous_price = self.previous_prices.get(coin.code, price)
+                        samples = price_history.last(coin.coin_id_for_price_getter, 2)
+                        previous_price = samples[0][1] if len(samples) == 2 else price
                         price_change = price - previous_price
                         change_symbol = '+' if price_change >= 0 else '-'
 
-                        print(f"{coin.code} {price:.4f} {change_symbol}{abs(price_change):.4f}")
-
-                        self.previous_prices[coin.code] = price
+                        logger.debug(f"{coin.code} {price:.4f} {change_symbol}{abs(price_change):.4f}")
 
             except Exception as e:
                 logging.error(f"Failed to update prices: {e}")
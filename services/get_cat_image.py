@@ -1,27 +1,98 @@
 import asyncio
+from collections import deque
+from typing import Deque, List
 
-from core import logger
+from core import logger, settings
 from core.models import http_helper
+from core.schemas import CatImages
+from services.telegram_file_cache import TelegramFileIdCache, cat_photo_file_ids
+
+CAT_API_URL = "https://api.thecatapi.com/v1/images/search"
+FALLBACK_CAT_IMAGE_URL = "https://masterpiecer-images.s3.yandex.net/505cfa23621d11eea5826a0259d7362a:upscaled"
+
+
+class CatImagePool:
+    """
+    Ready-to-send cat image URLs, so /meow and PriceMonitor never wait for TheCatAPI.
+
+    Every new URL is handed out once. When the pool drops below low_water_mark it is refilled in
+    the background with batched searches (the API's limit parameter). While the pool is empty (at
+    startup, TheCatAPI failing or rate limited) sent images are recycled: a random image whose Telegram
+    file_id is cached is handed out, so it is sent without an upload. The fallback image is only
+    used when there is none.
+    """
+
+    def __init__(self, pool_size: int = settings.cat_image.pool_size,
+                 low_water_mark: int = settings.cat_image.low_water_mark,
+                 batch_size: int = settings.cat_image.batch_size, api_key: str = settings.cat_image.api_key,
+                 file_ids: TelegramFileIdCache = cat_photo_file_ids):
+        self.pool_size = pool_size
+        self.low_water_mark = low_water_mark
+        self.batch_size = batch_size
+        self.api_key = api_key
+        self.file_ids = file_ids
+        self.urls: Deque[str] = deque()
+        self.refill_task: asyncio.Task | None = None
+
+    def __len__(self):
+        return len(self.urls)
+
+    def get(self) -> str:
+        """Take an image URL instantly, triggering a background refill at the low-water mark."""
+        url = self.urls.popleft() if self.urls else None
+        if len(self.urls) < self.low_water_mark:
+            self.refill()
+        if url is None:
+            url = self.file_ids.random_url()
+        if url is None:
+            logger.warning("Cat image pool is empty, using fallback image URL")
+            return FALLBACK_CAT_IMAGE_URL
+        return url
+
+    def refill(self) -> None:
+        """Start a background refill unless one is already running."""
+        if self.refill_task is None or self.refill_task.done():
+            self.refill_task = asyncio.create_task(self.fill())
+
+    async def fill(self) -> None:
+        while len(self.urls) < self.pool_size:
+            try:
+                urls = await self.fetch_batch(min(self.batch_size, self.pool_size - len(self.urls)))
+            except Exception as e:
+                # Rate limiting and retries with backoff are done by http_helper, the next get() tries again
+                logger.error("Failed to refill cat image pool: %s", e)
+                return
+            known = set(self.urls)
+            new_urls = [url for url in urls if url not in known]
+            if not new_urls:
+                logger.error("TheCatAPI returned no new images")
+                return
+            self.urls.extend(new_urls)
+
+    async def start(self) -> None:
+        """Prefill the pool in the background."""
+        self.refill()
+
+    async def stop(self) -> None:
+        if self.refill_task:
+            self.refill_task.cancel()
+            try:
+                await self.refill_task
+            except asyncio.CancelledError:
+                pass
+            self.refill_task = None
+
+    async def fetch_batch(self, limit: int) -> List[str]:
+        headers = {"x-api-key": self.api_key} if self.api_key else {}
+        # Every search returns random images, a cached response would repeat the same cats
+        images = await http_helper.get_json(CAT_API_URL, CatImages, use_cache=False,
+                                            params={"limit": limit}, headers=headers)
+        return [image.url for image in images]
+
+
+# Global pool shared by /meow and PriceMonitor
+cat_image_pool = CatImagePool()
 
 
 async def get_random_cat_image() -> str:
-    max_retry = 3
-    url = "https://api.thecatapi.com/v1/images/search"
-    for retry in range(max_retry):
-        client = await http_helper.get_client()
-        try:
-            response = await client.request('GET', url)
-            if response.status == 200:
-                data = await response.json()
-                return data[0]["url"]
-            else:
-                raise Exception(f"Unexpected status code: {response.status}")
-        except Exception as e:
-            logger.error(f"Request error (attempt {retry + 1}/{max_retry}): %s", e)
-            if retry < max_retry - 1:
-                await asyncio.sleep(1)
-        finally:
-            await http_helper.release_client(client)
-
-    logger.warning("All attempts failed, using fallback image URL")
-    return "https://masterpiecer-images.s3.yandex.net/505cfa23621d11eea5826a0259d7362a:upscaled"
+    return cat_image_pool.get()
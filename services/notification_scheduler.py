@@ -0,0 +1,87 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Callable, List
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from core import logger, settings
+from services.telegram_file_cache import cat_photo_file_ids
+
+
+@dataclass
+class Notification:
+    chat_id: int
+    caption: str
+    photo: str
+
+
+class NotificationScheduler:
+    """
+    Worker pool delivering notifications from a bounded queue.
+
+    Producers block on submit() when the queue is full, so evaluation never runs ahead of delivery
+    by more than queue_size messages, and at most `concurrency` Telegram requests are in flight.
+    """
+
+    def __init__(self, bot: Bot, concurrency: int = settings.price_monitor.notify_concurrency,
+                 queue_size: int = settings.price_monitor.notify_queue_size, max_retry: int = 3,
+                 should_deliver: Callable[[int], bool] | None = None):
+        """
+        :param should_deliver: Checked with the chat_id right before sending, e.g. the shard ownership of a worker
+        """
+        self.bot = bot
+        self.should_deliver = should_deliver
+        self.concurrency = concurrency
+        self.max_retry = max_retry
+        self.queue: asyncio.Queue[Notification] = asyncio.Queue(maxsize=queue_size)
+        self.workers: List[asyncio.Task] = []
+
+    async def start(self):
+        """Start the delivery workers."""
+        if not self.workers:
+            self.workers = [asyncio.create_task(self.worker()) for _ in range(self.concurrency)]
+
+    async def submit(self, notification: Notification):
+        """Queue a notification, waiting while the queue is full."""
+        await self.queue.put(notification)
+
+    async def join(self):
+        """Wait until every queued notification has been handled."""
+        await self.queue.join()
+
+    async def stop(self):
+        """Cancel the delivery workers, dropping whatever is still queued."""
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers.clear()
+
+    async def worker(self):
+        while True:
+            notification = await self.queue.get()
+            try:
+                await self.deliver(notification)
+            finally:
+                self.queue.task_done()
+
+    async def deliver(self, notification: Notification):
+        if self.should_deliver is not None and not self.should_deliver(notification.chat_id):
+            logger.info(f"Dropped notification for {notification.chat_id}, its shard is no longer owned")
+            return
+        for retry in range(self.max_retry):
+            try:
+                # After the first upload the fan-out references the Telegram file instead of the image host
+                await cat_photo_file_ids.send(notification.photo, lambda photo: self.bot.send_photo(
+                    notification.chat_id, photo=photo, caption=notification.caption))
+                return
+            except TelegramRetryAfter as e:
+                # Flood control: the worker waits, the queue keeps the backpressure on producers
+                logger.warning(f"Flood limit hit for {notification.chat_id} (attempt {retry + 1}/{self.max_retry}), "
+                               f"retrying in {e.retry_after}s")
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                logger.error(f"Failed to notify user {notification.chat_id}: {e}")
+                return
+
+        logger.error(f"Giving up notifying user {notification.chat_id} after {self.max_retry} attempts")
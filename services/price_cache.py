@@ -0,0 +1,130 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Set
+
+from core import logger, settings
+
+
+@dataclass
+class CachedPrice:
+    price: float
+    fetched_at: float
+
+
+class PriceCache:
+    """
+    Process-wide price cache keyed by coin_id_for_price_getter.
+
+    Concurrent misses are coalesced: ids that are already being fetched are awaited instead of
+    being requested again, so a burst of identical requests results in a single upstream call.
+    Forced fetches (max_age=0) only join other forced fetches: a regular fetch may be answered by
+    cached HTTP responses, which a forced one must not see.
+    """
+
+    def __init__(self, ttl: float = settings.price_service.cache_ttl):
+        self.ttl = ttl
+        self.prices: Dict[str, CachedPrice] = {}
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        # Futures of the in-flight forced fetches
+        self.forced_fetches: Set[asyncio.Future] = set()
+        self.refresh_tasks: Set[asyncio.Task] = set()
+
+    def update(self, prices: Dict[str, float], fetched_at: float | None = None) -> None:
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        for coin_id, price in prices.items():
+            self.prices[coin_id] = CachedPrice(price=price, fetched_at=fetched_at)
+
+    def get_fresh(self, coin_ids: List[str], max_age: float | None = None) -> Dict[str, float]:
+        max_age = self.ttl if max_age is None else max_age
+        now = time.time()
+        fresh = {}
+        for coin_id in coin_ids:
+            cached = self.prices.get(coin_id)
+            if cached is not None and now - cached.fetched_at < max_age:
+                fresh[coin_id] = cached.price
+        return fresh
+
+    def age(self, coin_id: str) -> float | None:
+        """Seconds since the cached price of the id was fetched."""
+        cached = self.prices.get(coin_id)
+        return None if cached is None else time.time() - cached.fetched_at
+
+    async def get(self, coin_ids: List[str], fetch: Callable[[List[str]], Awaitable[Dict[str, float]]],
+                  max_age: float | None = None, stale_max_age: float | None = None) -> Dict[str, float]:
+        """
+        Get prices from the cache, fetching the missing ones with a single coalesced call.
+
+        :param coin_ids: Ids for the price provider
+        :param fetch: Upstream fetch for a list of ids
+        :param max_age: Maximum age of cached prices in seconds, the cache TTL by default; 0 forces a fetch
+        :param stale_max_age: When given, expired prices up to this age are returned right away
+            and refreshed in the background (stale-while-revalidate)
+        :return: Prices keyed by id, ids the upstream did not return are absent
+        """
+        prices = self.get_fresh(coin_ids, max_age)
+        missing = [coin_id for coin_id in dict.fromkeys(coin_ids) if coin_id not in prices]
+        if not missing:
+            return prices
+
+        if stale_max_age is not None:
+            stale = self.get_fresh(missing, stale_max_age)
+            if stale:
+                prices.update(stale)
+                to_refresh = [coin_id for coin_id in stale if coin_id not in self.in_flight]
+                if to_refresh:
+                    task = asyncio.create_task(self.fetch_coalesced(to_refresh, fetch))
+                    self.refresh_tasks.add(task)
+                    task.add_done_callback(self.refresh_tasks.discard)
+                missing = [coin_id for coin_id in missing if coin_id not in stale]
+                if not missing:
+                    return prices
+
+        forced = max_age == 0
+        pending = {coin_id: self.in_flight[coin_id] for coin_id in missing
+                   if coin_id in self.in_flight and (not forced or self.in_flight[coin_id] in self.forced_fetches)}
+        to_fetch = [coin_id for coin_id in missing if coin_id not in pending]
+
+        if to_fetch:
+            fetched = await self.fetch_coalesced(to_fetch, fetch, forced)
+            prices.update((coin_id, fetched[coin_id]) for coin_id in to_fetch if coin_id in fetched)
+
+        for coin_id, future in pending.items():
+            fetched = await asyncio.shield(future)
+            if coin_id in fetched:
+                prices[coin_id] = fetched[coin_id]
+
+        return prices
+
+    async def fetch_coalesced(self, coin_ids: List[str], fetch: Callable[[List[str]], Awaitable[Dict[str, float]]],
+                              forced: bool = False) -> Dict[str, float]:
+        """
+        Fetch ids that are not in flight, concurrent callers await the same future.
+
+        :param forced: The fetch bypasses cached HTTP responses, forced callers may join it
+        """
+        future = asyncio.get_running_loop().create_future()
+        if forced:
+            self.forced_fetches.add(future)
+        for coin_id in coin_ids:
+            # A forced fetch takes over the ids of a regular one, later callers join the fresher fetch
+            self.in_flight[coin_id] = future
+
+        fetched = {}
+        try:
+            fetched = await fetch(coin_ids)
+            self.update(fetched)
+        except Exception as e:
+            logger.error(f"Failed to fetch prices: {e}")
+        finally:
+            # Waiters always get a result, a failed fetch simply has no prices
+            future.set_result(fetched)
+            self.forced_fetches.discard(future)
+            for coin_id in coin_ids:
+                if self.in_flight.get(coin_id) is future:
+                    del self.in_flight[coin_id]
+        return fetched
+
+
+# Global cache shared by handlers and PriceMonitor
+price_cache = PriceCache()
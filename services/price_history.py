@@ -0,0 +1,159 @@
+import time
+from array import array
+from typing import Dict, Iterable, List, Tuple
+
+from core import settings
+
+
+class PriceRingBuffer:
+    """
+    Fixed-capacity history of one coin: timestamps and prices in two preallocated array('d').
+
+    Appends are O(1) and overwrite the oldest sample once the buffer is full.
+    Timestamps are expected to be non-decreasing, which lets window queries bisect.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.prices = array('d', bytes(8 * capacity))
+        # Physical position of the oldest sample
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def position(self, index: int) -> int:
+        """Physical position of the index-th oldest sample."""
+        return (self.start + index) % self.capacity
+
+    def append(self, price: float, timestamp: float) -> None:
+        if self.size < self.capacity:
+            position = self.position(self.size)
+            self.size += 1
+        else:
+            position = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.timestamps[position] = timestamp
+        self.prices[position] = price
+
+    def latest(self) -> Tuple[float, float] | None:
+        if not self.size:
+            return None
+        position = self.position(self.size - 1)
+        return self.timestamps[position], self.prices[position]
+
+    def last(self, n: int) -> List[Tuple[float, float]]:
+        """Up to n most recent (timestamp, price) samples, oldest first."""
+        n = min(n, self.size)
+        return [(self.timestamps[p], self.prices[p])
+                for p in (self.position(i) for i in range(self.size - n, self.size))]
+
+    def bisect_timestamp(self, timestamp: float) -> int:
+        """Index of the first sample newer than timestamp."""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamps[self.position(middle)] <= timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def window(self, seconds: float, now: float) -> List[float]:
+        """Prices sampled within the last seconds."""
+        first = self.bisect_timestamp(now - seconds)
+        return [self.prices[self.position(i)] for i in range(first, self.size)]
+
+    def min_max(self, seconds: float, now: float) -> Tuple[float, float] | None:
+        prices = self.window(seconds, now)
+        if not prices:
+            return None
+        return min(prices), max(prices)
+
+    def price_at(self, timestamp: float) -> float | None:
+        """Last price sampled at or before timestamp, None if the history does not reach that far back."""
+        index = self.bisect_timestamp(timestamp) - 1
+        if index < 0:
+            return None
+        return self.prices[self.position(index)]
+
+    def percent_change(self, seconds: float, now: float) -> float | None:
+        """Change of the latest price against the price seconds ago, in percent."""
+        latest = self.latest()
+        baseline = self.price_at(now - seconds)
+        if latest is None or not baseline:
+            return None
+        return (latest[1] - baseline) / baseline * 100
+
+    def change_rate(self, seconds: float, now: float) -> float | None:
+        """
+        Relative price change per second of the latest price against the last price sampled at least
+        seconds ago. Samples taken seconds apart (e.g. by handlers) would make the rate of adjacent
+        samples jump, over the window they average out.
+        """
+        latest = self.latest()
+        index = self.bisect_timestamp(now - seconds) - 1
+        if latest is None or index < 0:
+            return None
+        position = self.position(index)
+        baseline_at, baseline = self.timestamps[position], self.prices[position]
+        latest_at, latest_price = latest
+        if not baseline or latest_at <= baseline_at:
+            return None
+        return abs(latest_price - baseline) / abs(baseline) / (latest_at - baseline_at)
+
+
+class PriceHistory:
+    """
+    In-memory price history keyed by coin_id_for_price_getter, fed by every upstream fetch.
+
+    The single source for price change calculations of handlers and PriceMonitor.
+    """
+
+    def __init__(self, capacity: int = settings.price_service.history_capacity):
+        self.capacity = capacity
+        self.buffers: Dict[str, PriceRingBuffer] = {}
+
+    def record(self, prices: Dict[str, float], timestamp: float | None = None) -> None:
+        timestamp = time.time() if timestamp is None else timestamp
+        for coin_id, price in prices.items():
+            buffer = self.buffers.get(coin_id)
+            if buffer is None:
+                buffer = self.buffers[coin_id] = PriceRingBuffer(self.capacity)
+            buffer.append(price, timestamp)
+
+    def forget(self, coin_ids: Iterable[str]) -> None:
+        for coin_id in coin_ids:
+            self.buffers.pop(coin_id, None)
+
+    def last(self, coin_id: str, n: int) -> List[Tuple[float, float]]:
+        buffer = self.buffers.get(coin_id)
+        return buffer.last(n) if buffer else []
+
+    def min_max(self, coin_id: str, seconds: float, now: float | None = None) -> Tuple[float, float] | None:
+        buffer = self.buffers.get(coin_id)
+        return buffer.min_max(seconds, time.time() if now is None else now) if buffer else None
+
+    def percent_change(self, coin_id: str, seconds: float, now: float | None = None) -> float | None:
+        """
+        :param coin_id: Id for the price provider
+        :param seconds: Window length
+        :return: Change of the latest price in percent, None if the history is shorter than the window
+        """
+        buffer = self.buffers.get(coin_id)
+        return buffer.percent_change(seconds, time.time() if now is None else now) if buffer else None
+
+    def change_rate(self, coin_id: str, seconds: float, now: float | None = None) -> float | None:
+        """
+        :param coin_id: Id for the price provider
+        :param seconds: Minimum span the rate is measured over
+        :return: Relative price change per second, None if the history is shorter than the window
+        """
+        buffer = self.buffers.get(coin_id)
+        return buffer.change_rate(seconds, time.time() if now is None else now) if buffer else None
+
+
+# Global history shared by handlers and PriceMonitor
+price_history = PriceHistory()
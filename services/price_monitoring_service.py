@@ -1,90 +1,446 @@
 import asyncio
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Collection, Dict, List, Set, Tuple
+from uuid import UUID
+
+import numpy as np
 from aiogram import Bot
 # from aiogram.types import InputFile
 
-from core import logger
+from core import logger, settings
 from core.models import db_helper, Coin, UserCoinAssociation
 from services import UserService, CoinService, CryptoPriceService
+from services.alert_snapshot import AlertSnapshot
+from services.coin_poll_scheduler import CoinPollScheduler
 from services.get_cat_image import get_random_cat_image
+from services.notification_scheduler import NotificationScheduler, Notification
+from services.price_history import price_history
+from services.price_stream import PriceStreamClient
+from services.price_threshold_index import price_threshold_index, ThresholdEntry
+from services.shard_lease import ShardLeaseManager, ShardFilter, count_live_workers
+
+# Edits committed by transactions that started before the previous sync are still picked up
+INDEX_SYNC_OVERLAP = timedelta(seconds=30)
 
 
 class PriceMonitor:
-    def __init__(self, bot: Bot, update_interval: int = 300):
+    def __init__(self, bot: Bot, update_interval: int = settings.price_monitor.update_interval,
+                 shard_lease: ShardLeaseManager | None = None,
+                 price_change_epsilon: float = settings.price_monitor.price_change_epsilon,
+                 stream_enabled: bool = settings.price_stream.enabled):
         self.bot = bot
         self.update_interval = update_interval
+        self.price_change_epsilon = price_change_epsilon
+        if settings.price_monitor.adaptive_polling:
+            self.poll_scheduler = CoinPollScheduler()
+        else:
+            self.poll_scheduler = CoinPollScheduler(min_interval=update_interval, max_interval=update_interval)
+        # Coin.id -> price the coin's watchers were last evaluated at
+        self.last_evaluated_prices: Dict[UUID, float] = {}
+        # Coin.id -> monotonic time saved_rate_to_compare was last rolled. Growth / decline rules compare
+        # against the price of the previous update_interval window, however often the coin is polled
+        self.baseline_rolled_at: Dict[UUID, float] = {}
+        # Coin.id -> (association id, is growth) of the percentage rules that fired in the current baseline
+        # window. They stay silent until the baseline rolls, otherwise every poll of the window repeats them
+        self.percentage_alerts_sent: Dict[UUID, Set[Tuple[UUID, bool]]] = defaultdict(set)
         self.crypto_price_service = CryptoPriceService()
+        # Without a shard lease the monitor watches every user
+        self.shard_lease = shard_lease
+        # A worker that lost a shard since the alert was evaluated must not send it, the new owner does
+        self.notification_scheduler = NotificationScheduler(
+            bot, should_deliver=shard_lease.owns if shard_lease else None)
+        self.index_shard_filter: ShardFilter | None = None
+        self.index_loaded_at = 0.0
+        # Database time of the last full load or delta sync of the threshold index
+        self.index_synced_at: datetime | None = None
+        # Streaming mode: prices are pushed by the websocket feed, coins it does not price are polled
+        self.price_stream = PriceStreamClient() if stream_enabled else None
+        # coin_id_for_price_getter -> monotonic time of its last streamed price
+        self.streamed_at: Dict[str, float] = {}
+        # Active priceable coins, re-read every update_interval instead of on every poll or streamed batch
+        self.priceable_coins: List[Coin] = []
+        self.coins_loaded_at: float | None = None
 
     @staticmethod
-    def check_price_conditions(coin: Coin, association: UserCoinAssociation, current_price: float):
-        conditions_met = []
+    def min_rate_condition(coin: Coin, min_rate: float, current_price: float) -> str:
+        return f"Цена {coin.code} упала до {current_price:.2f} (ниже {min_rate:.2f})"
 
-        if association.min_rate and current_price <= association.min_rate:
-            conditions_met.append(f"Цена {coin.code} упала до {current_price:.2f} (ниже {association.min_rate:.2f})")
+    @staticmethod
+    def max_rate_condition(coin: Coin, max_rate: float, current_price: float) -> str:
+        return f"Цена {coin.code} поднялась до {current_price:.2f} (выше {max_rate:.2f})"
 
-        if association.max_rate and current_price >= association.max_rate:
-            conditions_met.append(
-                f"Цена {coin.code} поднялась до {current_price:.2f} (выше {association.max_rate:.2f})")
+    @staticmethod
+    def growth_condition(coin: Coin, growth: float, rate_percentage_growth: float) -> str:
+        return f"Цена {coin.code} выросла на {growth:.2f}% (больше {rate_percentage_growth:.2f}%)"
+
+    @staticmethod
+    def decline_condition(coin: Coin, decline: float, rate_percentage_declines: float) -> str:
+        return f"Цена {coin.code} упала на {decline:.2f}% (больше {rate_percentage_declines:.2f}%)"
+
+    @classmethod
+    def check_percentage_conditions(cls, coin: Coin, association: UserCoinAssociation, current_price: float):
+        conditions_met = []
 
         if association.rate_percentage_growth and association.saved_rate_to_compare:
             growth = (current_price - association.saved_rate_to_compare) / association.saved_rate_to_compare * 100
             if growth >= association.rate_percentage_growth:
-                conditions_met.append(
-                    f"Цена {coin.code} выросла на {growth:.2f}% (больше {association.rate_percentage_growth:.2f}%)")
+                conditions_met.append(cls.growth_condition(coin, growth, association.rate_percentage_growth))
 
         if association.rate_percentage_declines and association.saved_rate_to_compare:
             decline = (association.saved_rate_to_compare - current_price) / association.saved_rate_to_compare * 100
             if decline >= association.rate_percentage_declines:
-                conditions_met.append(
-                    f"Цена {coin.code} упала на {decline:.2f}% (больше {association.rate_percentage_declines:.2f}%)")
+                conditions_met.append(cls.decline_condition(coin, decline, association.rate_percentage_declines))
 
         return conditions_met
 
-    async def process_user(self, user, current_prices, cat_image_url):
-        async with db_helper.db_session() as session:
-            user_service = UserService(session)
-            user_coins = await user_service.get_user_coins(user.chat_id)
+    @classmethod
+    def check_price_conditions(cls, coin: Coin, association: UserCoinAssociation, current_price: float):
+        """
+        Stateless scalar evaluation of every rule of one association, the reference for the vectorized
+        and indexed paths. The monitor additionally applies alert hysteresis to min/max rules.
+        """
+        conditions_met = []
 
-            all_conditions_met = []
-            for coin, association in user_coins:
-                if coin.coin_id_for_price_getter in current_prices:
-                    current_price = current_prices[coin.coin_id_for_price_getter]
-                    conditions_met = self.check_price_conditions(coin, association, current_price)
-                    all_conditions_met.extend(conditions_met)
-
-                    # Update saved_rate_to_compare
-                    await user_service.update_user_coin(
-                        user.chat_id,
-                        coin.id,
-                        association.id,
-                        saved_rate_to_compare=current_price
-                    )
-
-            if all_conditions_met:
-                message = "Уведомление о изменении цены:\n" + "\n".join(all_conditions_met)
-                await self.bot.send_photo(user.chat_id, photo=cat_image_url, caption=message)
-
-    async def update_prices_and_notify(self):
+        if association.min_rate and current_price <= association.min_rate:
+            conditions_met.append(cls.min_rate_condition(coin, association.min_rate, current_price))
+
+        if association.max_rate and current_price >= association.max_rate:
+            conditions_met.append(cls.max_rate_condition(coin, association.max_rate, current_price))
+
+        conditions_met.extend(cls.check_percentage_conditions(coin, association, current_price))
+
+        return conditions_met
+
+    def threshold_index_is_stale(self, shard_filter: ShardFilter | None) -> bool:
+        # Edits are applied every cycle by sync_threshold_index() and fired alerts are verified against
+        # the database, the full reload drops deleted thresholds that never fire and follows shard changes
+        return (not price_threshold_index.is_loaded
+                or self.index_synced_at is None
+                or shard_filter != self.index_shard_filter
+                or time.monotonic() - self.index_loaded_at > settings.price_monitor.index_refresh_interval)
+
+    async def load_threshold_index(self, user_service: UserService, shard_filter: ShardFilter | None):
+        synced_at = await user_service.get_database_time()
+        entries = [
+            ThresholdEntry(
+                association_id=association.id,
+                coin_id=coin.id,
+                chat_id=chat_id,
+                min_rate=association.min_rate,
+                max_rate=association.max_rate,
+                min_armed=association.min_alert_armed,
+                max_armed=association.max_alert_armed,
+            )
+            async for coin, association, chat_id in user_service.iter_associations(shard_filter=shard_filter)
+        ]
+        price_threshold_index.rebuild(entries)
+        self.index_shard_filter = shard_filter
+        self.index_loaded_at = time.monotonic()
+        self.index_synced_at = synced_at
+        # Watchers may have changed, so every coin gets evaluated again once
+        self.last_evaluated_prices.clear()
+        logger.info("Threshold index loaded with %s associations.", len(price_threshold_index))
+
+    async def sync_threshold_index(self, user_service: UserService, shard_filter: ShardFilter | None):
+        """
+        Apply the thresholds edited since the last sync, e.g. by the bot process while this one is a worker.
+        """
+        synced_at = await user_service.get_database_time()
+        changed = 0
+        async for coin, association, chat_id in user_service.iter_associations(
+                shard_filter=shard_filter, updated_since=self.index_synced_at - INDEX_SYNC_OVERLAP):
+            changed += price_threshold_index.upsert(association, chat_id)
+        self.index_synced_at = synced_at
+        if changed:
+            logger.info("Threshold index updated with %s edited associations.", changed)
+
+    async def verify_fired_entries(self, user_service: UserService, shard_filter: ShardFilter | None,
+                                   association_ids: Collection[UUID]) -> Set[UUID]:
+        """
+        Check fired min/max alerts against the database before they are sent.
+
+        Deleted associations are dropped from the index and edited ones are re-indexed with their
+        current thresholds, they are evaluated again in the next cycle.
+
+        :return: Ids of the associations whose alerts are still valid
+        """
+        if not association_ids:
+            return set()
+        valid, seen = set(), set()
+        async for coin, association, chat_id in user_service.iter_associations(
+                shard_filter=shard_filter, association_ids=association_ids):
+            seen.add(association.id)
+            if not price_threshold_index.upsert(association, chat_id):
+                valid.add(association.id)
+        for association_id in set(association_ids) - seen:
+            price_threshold_index.discard(association_id)
+        if len(valid) < len(association_ids):
+            logger.info("Dropped %s alerts of deleted or edited thresholds.", len(association_ids) - len(valid))
+        return valid
+
+    async def get_priceable_coins(self, coin_service: CoinService) -> List[Coin]:
+        now = time.monotonic()
+        if self.coins_loaded_at is None or now - self.coins_loaded_at >= self.update_interval:
+            coins = [coin for coin in await coin_service.get_all_active_coins() if coin.coin_id_for_price_getter]
+            for coin in coins:
+                # Kept across sessions: a rollback of a later session must not expire them
+                coin_service.session.expunge(coin)
+            self.priceable_coins = coins
+            self.coins_loaded_at = now
+            if self.price_stream:
+                self.price_stream.subscribe(coin.coin_id_for_price_getter for coin in coins)
+        return self.priceable_coins
+
+    def unstreamed_coins(self, coins: List[Coin]) -> List[Coin]:
+        """Coins without a streamed price within the stream's stale timeout, e.g. unknown to the feed."""
+        oldest_allowed = time.monotonic() - self.price_stream.stale_timeout
+        return [coin for coin in coins if self.streamed_at.get(coin.coin_id_for_price_getter, -1.0) < oldest_allowed]
+
+    def price_moved(self, coin_id: UUID, current_price: float) -> bool:
+        last_price = self.last_evaluated_prices.get(coin_id)
+        if last_price is None:
+            return True
+        return abs(current_price - last_price) > self.price_change_epsilon * abs(last_price)
+
+    def due_baselines(self, prices: Dict[UUID, float]) -> Dict[UUID, float]:
+        """Prices of the coins whose baseline window of update_interval seconds is over."""
+        now = time.monotonic()
+        due = {}
+        for coin_id, price in prices.items():
+            # A coin seen for the first time keeps the stored baseline for one window
+            rolled_at = self.baseline_rolled_at.setdefault(coin_id, now)
+            if now - rolled_at >= self.update_interval:
+                due[coin_id] = price
+        return due
+
+    def reschedule_coins(self, coins: List[Coin], current_prices: Dict[str, float]):
+        for coin in coins:
+            current_price = current_prices.get(coin.coin_id_for_price_getter)
+            if current_price is None:
+                # Fetch failed or the provider does not know the coin: retry soon
+                self.poll_scheduler.schedule(coin.id, time.monotonic() + self.poll_scheduler.min_interval)
+                continue
+
+            change_rate = price_history.change_rate(coin.coin_id_for_price_getter,
+                                                    settings.price_monitor.change_rate_window)
+            if change_rate is not None:
+                self.poll_scheduler.observe(coin.id, change_rate)
+            self.poll_scheduler.reschedule(
+                coin.id,
+                threshold_distance=price_threshold_index.nearest_threshold_distance(coin.id, current_price),
+                watchers=price_threshold_index.watcher_count(coin.id),
+            )
+
+    def collect_percentage_notifications(self, snapshot: AlertSnapshot, current_prices: Dict[str, float],
+                                         notifications: Dict[int, List[str]]):
+        """Add growth / decline alerts of the snapshot rows, each rule fires once per baseline window."""
+        evaluation = snapshot.evaluate(current_prices)
+
+        for hits, is_growth in ((evaluation.growth_hit, True), (evaluation.decline_hit, False)):
+            for row in np.flatnonzero(hits):
+                coin = snapshot.coins[snapshot.coin_index[row]]
+                sent = self.percentage_alerts_sent[coin.id]
+                key = (snapshot.association_ids[row], is_growth)
+                if key in sent:
+                    continue
+                sent.add(key)
+                if is_growth:
+                    condition = self.growth_condition(coin, evaluation.growth[row],
+                                                      snapshot.rate_percentage_growth[row])
+                else:
+                    condition = self.decline_condition(coin, evaluation.decline[row],
+                                                       snapshot.rate_percentage_declines[row])
+                notifications[int(snapshot.chat_id[row])].append(condition)
+
+    def baselines_rolled(self, coin_ids: Collection[UUID]) -> None:
+        """Start a new baseline window for the coins whose saved_rate_to_compare was rolled."""
+        now = time.monotonic()
+        for coin_id in coin_ids:
+            self.baseline_rolled_at[coin_id] = now
+            # Compared against the new baseline, the rules may fire again
+            self.percentage_alerts_sent.pop(coin_id, None)
+
+    async def notify_user(self, chat_id: int, conditions_met: List[str], cat_image_url: str):
+        message = "Уведомление о изменении цены:\n" + "\n".join(conditions_met)
+        await self.notification_scheduler.submit(Notification(chat_id=chat_id, caption=message, photo=cat_image_url))
+
+    async def poll_prices(self, priceable_coins: List[Coin]) -> Tuple[List[Coin], Dict[str, float]]:
+        """Fetch the prices of the coins that are due according to the poll scheduler."""
+        self.poll_scheduler.sync(coin.id for coin in priceable_coins)
+
+        # Only the coins that are due are fetched, still in one upstream call
+        due_coin_ids = set(self.poll_scheduler.pop_due())
+        due_coins = [coin for coin in priceable_coins if coin.id in due_coin_ids]
+        if not due_coins:
+            return [], {}
+
+        current_prices = {}
+        try:
+            # Always fetched fresh, handlers are then served from this snapshot
+            current_prices = await self.crypto_price_service.get_crypto_prices(
+                [coin.coin_id_for_price_getter for coin in due_coins], max_age=0)
+        finally:
+            self.reschedule_coins(due_coins, current_prices)
+        return due_coins, current_prices
+
+    async def update_prices_and_notify(self, streamed_prices: Dict[str, float] | None = None):
+        """
+        Run one evaluation cycle.
+
+        :param streamed_prices: Batch from the price stream, the due coins are polled when not given
+        """
         try:
+            notifications: Dict[int, List[str]] = defaultdict(list)
+            # Taken even if the cycle is skipped, so a pending change never keeps waking up the loop
+            changed_coin_ids = price_threshold_index.pop_changed_coins()
+
+            shard_filter = self.shard_lease.shard_filter() if self.shard_lease else None
+            if shard_filter is not None and not shard_filter.shards:
+                logger.info("No monitor shards owned, skipping cycle.")
+                return
+
             async with db_helper.db_session() as session:
+                if self.shard_lease is None and await count_live_workers(session):
+                    # Both would notify every user: the workers own the users, the embedded monitor stands down
+                    logger.error("monitor_worker.py processes are running, the embedded PriceMonitor skips its cycle. "
+                                 "Set PRICE_MONITOR_EMBEDDED=False for the bot process.")
+                    return
+
                 user_service = UserService(session)
                 coin_service = CoinService(session)
 
-                all_users = await user_service.get_all_users()
-                all_coins = await coin_service.get_all_active_coins()
+                if self.threshold_index_is_stale(shard_filter):
+                    await self.load_threshold_index(user_service, shard_filter)
+                else:
+                    await self.sync_threshold_index(user_service, shard_filter)
+                # Edited watchers are evaluated right away, even if the coin is backed off or its price is flat
+                now = time.monotonic()
+                for coin_id in changed_coin_ids | price_threshold_index.pop_changed_coins():
+                    self.last_evaluated_prices.pop(coin_id, None)
+                    self.poll_scheduler.schedule(coin_id, now)
 
-            coin_ids = [coin.coin_id_for_price_getter for coin in all_coins if coin.coin_id_for_price_getter]
-            current_prices = await self.crypto_price_service.get_crypto_prices(coin_ids)
+                priceable_coins = await self.get_priceable_coins(coin_service)
+
+                if streamed_prices is None:
+                    due_coins, current_prices = await self.poll_prices(priceable_coins)
+                else:
+                    # The feed may never price some coins, or be down: those are polled on their schedule
+                    due_coins, current_prices = await self.poll_prices(self.unstreamed_coins(priceable_coins))
+                    due_coins += [coin for coin in priceable_coins if coin.coin_id_for_price_getter in streamed_prices]
+                    current_prices = {**current_prices, **streamed_prices}
+                if not current_prices:
+                    return
+
+                # Only coins whose price moved since their last evaluation are "dirty"
+                dirty_coins = [
+                    coin for coin in due_coins
+                    if coin.coin_id_for_price_getter in current_prices
+                    and self.price_moved(coin.id, current_prices[coin.coin_id_for_price_getter])
+                ]
+                if not dirty_coins:
+                    logger.info("No coin price moved since the last evaluation, skipping cycle.")
+                    return
+
+                # min_rate / max_rate: a few bisects per coin, only the alerts that fire or re-arm are visited.
+                # An alert is sent once per crossing and re-armed after the price leaves the re-arm band
+                fired_min, fired_max, rearmed_min, rearmed_max = {}, {}, {}, {}
+                fired = []
+                for coin in dirty_coins:
+                    current_price = current_prices[coin.coin_id_for_price_getter]
+                    transitions = price_threshold_index.apply_price(coin.id, current_price)
+                    fired.extend((coin, entry, current_price, True) for entry in transitions.fired_min)
+                    fired.extend((coin, entry, current_price, False) for entry in transitions.fired_max)
+                    rearmed_min.update((entry.association_id, current_price) for entry in transitions.rearmed_min)
+                    rearmed_max.update((entry.association_id, current_price) for entry in transitions.rearmed_max)
+
+                valid = await self.verify_fired_entries(user_service, shard_filter,
+                                                        {entry.association_id for _, entry, _, _ in fired})
+                for coin, entry, current_price, is_min in fired:
+                    if entry.association_id not in valid:
+                        continue
+                    if is_min:
+                        notifications[entry.chat_id].append(
+                            self.min_rate_condition(coin, entry.min_rate, current_price))
+                        fired_min[entry.association_id] = current_price
+                    else:
+                        notifications[entry.chat_id].append(
+                            self.max_rate_condition(coin, entry.max_rate, current_price))
+                        fired_max[entry.association_id] = current_price
+
+                await user_service.bulk_update_alert_states("min_alert_armed", False, fired_min)
+                await user_service.bulk_update_alert_states("max_alert_armed", False, fired_max)
+                await user_service.bulk_update_alert_states("min_alert_armed", True, rearmed_min)
+                await user_service.bulk_update_alert_states("max_alert_armed", True, rearmed_max)
+
+                # Percentage rules depend on the per-row baseline: load the rule columns of the rows that have
+                # them straight into arrays and evaluate the whole tick with array operations
+                snapshot = AlertSnapshot.from_columns(dirty_coins, await user_service.get_alert_rule_rows(
+                    [coin.id for coin in dirty_coins], percentage_rules_only=True, shard_filter=shard_filter))
+                self.collect_percentage_notifications(snapshot, current_prices, notifications)
+
+                dirty_prices = {coin.id: current_prices[coin.coin_id_for_price_getter] for coin in dirty_coins}
+                self.last_evaluated_prices.update(dirty_prices)
+                # Roll the baselines of the coins whose window is over for every watcher in one statement
+                baseline_prices = self.due_baselines(dirty_prices)
+                await user_service.bulk_update_saved_rates(baseline_prices, shard_filter=shard_filter)
+                self.baselines_rolled(baseline_prices)
+
+            if not notifications:
+                return
 
             # Get a single cat image URL for all notifications
             cat_image_url = await get_random_cat_image()
 
-            # Process users concurrently
-            await asyncio.gather(*[self.process_user(user, current_prices, cat_image_url) for user in all_users])
+            # Delivery is pipelined through the scheduler queue, submit() blocks while it is full
+            for chat_id, conditions_met in notifications.items():
+                await self.notify_user(chat_id, conditions_met, cat_image_url)
 
         except Exception as e:
             logger.error(f"Failed to update prices and notify users: {e}")
 
     async def run(self):
+        await self.notification_scheduler.start()
+        try:
+            if self.price_stream:
+                await self.run_streaming()
+            else:
+                await self.run_polling()
+        finally:
+            if self.price_stream:
+                await self.price_stream.stop()
+            await self.notification_scheduler.stop()
+
+    async def run_polling(self):
         while True:
             await self.update_prices_and_notify()
-            await asyncio.sleep(self.update_interval)
+            # Wake up for the next due coin or an edited threshold (handlers of this process),
+            # but re-read the coin list at least every update_interval
+            await asyncio.sleep(1.0)
+            try:
+                await asyncio.wait_for(price_threshold_index.changed.wait(),
+                                       max(0.0, min(self.poll_scheduler.seconds_until_next_poll(),
+                                                    self.update_interval) - 1.0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_streaming(self):
+        await self.price_stream.start()
+        # The first cycle polls everything once and subscribes the stream to the active coins
+        await self.update_prices_and_notify()
+        while True:
+            try:
+                streamed_prices = await asyncio.wait_for(
+                    self.price_stream.queue.get(),
+                    timeout=max(1.0, min(self.poll_scheduler.seconds_until_next_poll(),
+                                         self.poll_scheduler.min_interval)))
+            except asyncio.TimeoutError:
+                # No ticks: the cycle still polls the coins the stream has not priced lately (all of them
+                # while it is down) and reloads the coin list and subscription every update_interval
+                streamed_prices = {}
+
+            now = time.monotonic()
+            self.streamed_at.update(dict.fromkeys(streamed_prices, now))
+            self.crypto_price_service.record_prices(streamed_prices, update_cache=True)
+            await self.update_prices_and_notify(streamed_prices)
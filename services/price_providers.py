@@ -0,0 +1,141 @@
+import json
+import math
+import random
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict, List
+
+from core import settings
+from core.models import http_helper
+from core.schemas import CoinGeckoSimplePrice, CoinCapAssets
+
+
+class PriceProvider(ABC):
+    """Source of USD prices for ids stored in Coin.coin_id_for_price_getter."""
+    name: str
+    # Maximum number of ids per upstream request
+    chunk_size: int = settings.price_service.chunk_size
+
+    @abstractmethod
+    async def fetch_chunk(self, coin_ids: List[str], fresh: bool = False) -> Dict[str, float]:
+        """
+        Fetch prices for at most chunk_size ids.
+
+        :param fresh: Forced fetch, the upstream is always asked: neither a fresh HTTP cache entry nor,
+            on failure, a stale one answers it
+        :return: Prices keyed by id, unknown ids are absent
+        :raise Exception: When the request fails as a whole
+        """
+
+
+class CoinGeckoPriceProvider(PriceProvider):
+    name = "coingecko"
+    url = "https://api.coingecko.com/api/v3/simple/price"
+
+    async def fetch_chunk(self, coin_ids: List[str], fresh: bool = False) -> Dict[str, float]:
+        params = {
+            "ids": ",".join(coin_ids),
+            "vs_currencies": "usd"
+        }
+        data = await http_helper.get_json(self.url, CoinGeckoSimplePrice, max_stale=0 if fresh else None,
+                                          revalidate=fresh, params=params)
+        return {coin_id: data[coin_id].usd for coin_id in coin_ids
+                if coin_id in data and data[coin_id].usd is not None}
+
+
+class CoinCapPriceProvider(PriceProvider):
+    """
+    CoinCap assets API. Its ids differ from the CoinGecko ones (binancecoin is binance-coin, ripple is xrp),
+    so only ids of the configured CoinGecko -> CoinCap map are asked for, the others stay unpriced.
+    """
+    name = "coincap"
+    chunk_size = min(settings.price_service.chunk_size, 100)
+
+    def __init__(self, url: str = settings.price_service.coincap_url,
+                 api_key: str = settings.price_service.coincap_api_key,
+                 id_map: Dict[str, str] = settings.price_service.coincap_id_map):
+        self.url = url
+        self.api_key = api_key
+        self.id_map = id_map
+
+    async def fetch_chunk(self, coin_ids: List[str], fresh: bool = False) -> Dict[str, float]:
+        coincap_ids = {self.id_map[coin_id]: coin_id for coin_id in coin_ids if coin_id in self.id_map}
+        if not coincap_ids:
+            return {}
+        params = {
+            "ids": ",".join(coincap_ids),
+            "limit": len(coincap_ids),
+        }
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        assets = await http_helper.get_json(self.url, CoinCapAssets, strict=False, max_stale=0 if fresh else None,
+                                            revalidate=fresh, params=params, headers=headers)
+        return {coincap_ids[asset.id]: asset.price_usd for asset in assets.data
+                if asset.id in coincap_ids and asset.price_usd is not None}
+
+
+class LocalPriceProvider(PriceProvider):
+    """
+    Deterministic offline provider for development and benchmarks.
+
+    With a file it replays prices from JSON ({"bitcoin": 63000.0} or {"bitcoin": [63000.0, 63100.5, ...]},
+    lists are served one value per fetch and wrap around), otherwise every id follows a seeded random walk.
+    """
+    name = "local"
+    chunk_size = 10_000
+
+    def __init__(self, file_path: str = settings.price_service.local_file, seed: int = settings.price_service.local_seed,
+                 volatility: float = settings.price_service.local_volatility):
+        self.seed = seed
+        self.volatility = volatility
+        self.replay: Dict[str, List[float]] = {}
+        self.steps: Dict[str, int] = {}
+        self.prices: Dict[str, float] = {}
+        self.generators: Dict[str, random.Random] = {}
+
+        if file_path:
+            with open(file_path) as file:
+                data = json.load(file)
+            self.replay = {coin_id: values if isinstance(values, list) else [values]
+                           for coin_id, values in data.items()}
+
+    async def fetch_chunk(self, coin_ids: List[str], fresh: bool = False) -> Dict[str, float]:
+        if self.replay:
+            return {coin_id: self.next_replayed_price(coin_id) for coin_id in coin_ids if coin_id in self.replay}
+        return {coin_id: self.next_random_walk_price(coin_id) for coin_id in coin_ids}
+
+    def next_replayed_price(self, coin_id: str) -> float:
+        values = self.replay[coin_id]
+        step = self.steps.get(coin_id, 0)
+        self.steps[coin_id] = step + 1
+        return float(values[step % len(values)])
+
+    def next_random_walk_price(self, coin_id: str) -> float:
+        coin_hash = zlib.crc32(coin_id.encode())
+        generator = self.generators.get(coin_id)
+        if generator is None:
+            generator = self.generators[coin_id] = random.Random(self.seed ^ coin_hash)
+            # Stable starting price between 0.01 and ~100k per id
+            self.prices[coin_id] = 10 ** (coin_hash % 700 / 100 - 2)
+
+        self.prices[coin_id] *= math.exp(generator.gauss(0, self.volatility))
+        return self.prices[coin_id]
+
+
+PROVIDERS = {
+    CoinGeckoPriceProvider.name: CoinGeckoPriceProvider,
+    CoinCapPriceProvider.name: CoinCapPriceProvider,
+    LocalPriceProvider.name: LocalPriceProvider,
+}
+
+
+def create_price_providers(names: List[str]) -> List[PriceProvider]:
+    """Instantiate providers by name, in failover order."""
+    unknown = [name for name in names if name not in PROVIDERS]
+    if unknown:
+        raise ValueError(f"Unknown price providers: {', '.join(unknown)}")
+    return [PROVIDERS[name]() for name in names]
+
+
+# Primary provider first, then the fallbacks
+price_providers = create_price_providers(
+    [settings.price_service.provider, *settings.price_service.fallback_providers])
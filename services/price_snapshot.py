@@ -0,0 +1,103 @@
+import asyncio
+import os
+import tempfile
+import time
+from typing import Dict, Tuple
+
+import msgspec
+
+from core import logger, settings
+from services.price_cache import PriceCache, price_cache
+from services.price_history import PriceHistory, price_history
+
+# coin_id_for_price_getter -> (price, fetched_at)
+Snapshot = Dict[str, Tuple[float, float]]
+
+
+class PriceSnapshotStore:
+    """
+    Keeps the latest price of every coin in a local msgpack file, so a restarted process
+    starts with a warm cache and a baseline in the price history.
+
+    Loaded prices keep their original fetch time, so the cache treats them as stale by age.
+    Saving runs in a thread and coalesces: fetches during a write are covered by one more write.
+    Every process writes through its own temporary file, processes sharing a path never mix their writes.
+    """
+
+    def __init__(self, path: str = settings.price_service.snapshot_file,
+                 max_age: int = settings.price_service.snapshot_max_age,
+                 cache: PriceCache = price_cache, history: PriceHistory = price_history):
+        self.path_template = path
+        self.path = path.replace("{role}", "bot")
+        self.max_age = max_age
+        self.cache = cache
+        self.history = history
+        self.dirty = False
+        self.save_task: asyncio.Task | None = None
+
+    def load(self, role: str = "bot") -> int:
+        """
+        Load the snapshot of the process role into the cache and the history, later saves go to the same file.
+
+        :param role: "bot" or "worker", replaces {role} in the path
+        :return: Number of loaded prices
+        """
+        self.path = self.path_template.replace("{role}", role)
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, "rb") as file:
+                snapshot = msgspec.msgpack.decode(file.read(), type=Snapshot)
+        except (OSError, msgspec.DecodeError, msgspec.ValidationError) as e:
+            logger.warning(f"Failed to load price snapshot {self.path}: {e}")
+            return 0
+
+        oldest_allowed = time.time() - self.max_age
+        loaded = 0
+        for coin_id, (price, fetched_at) in snapshot.items():
+            if fetched_at < oldest_allowed or coin_id in self.cache.prices:
+                continue
+            self.cache.update({coin_id: price}, fetched_at)
+            self.history.record({coin_id: price}, fetched_at)
+            loaded += 1
+        logger.info("Loaded %s prices from the snapshot %s.", loaded, self.path)
+        return loaded
+
+    def schedule_save(self) -> None:
+        """Request a save after a fetch, call from the event loop."""
+        if not self.path:
+            return
+        self.dirty = True
+        if self.save_task is None or self.save_task.done():
+            self.save_task = asyncio.create_task(self.save_loop())
+
+    async def save_loop(self) -> None:
+        while self.dirty:
+            self.dirty = False
+            snapshot = {coin_id: (cached.price, cached.fetched_at) for coin_id, cached in self.cache.prices.items()}
+            try:
+                await asyncio.to_thread(self.write, snapshot)
+            except OSError as e:
+                logger.error(f"Failed to save price snapshot {self.path}: {e}")
+
+    def write(self, snapshot: Snapshot) -> None:
+        # Unique per write and in the same directory, so the replace below stays on one filesystem
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".",
+                                                      prefix=f"{os.path.basename(self.path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(msgspec.msgpack.encode(snapshot))
+            # Atomic on POSIX, readers never see a partial file
+            os.replace(temporary_path, self.path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    async def stop(self) -> None:
+        """Wait for a pending save."""
+        if self.save_task:
+            await self.save_task
+
+
+# Global snapshot store of the shared price cache
+price_snapshot = PriceSnapshotStore()
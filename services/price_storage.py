@@ -0,0 +1,263 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from sqlalchemy import select, text, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import logger, settings
+from core.models import db_helper, price_ticks, price_ohlc_1m, price_ohlc_1h, price_ohlc_1d
+
+PARTITION_PREFIX = "price_ticks_p"
+
+# (target table, date_trunc unit, source table, source time column, open/high/low/close/ticks aggregates)
+ROLLUPS = [
+    (price_ohlc_1m.name, "minute", price_ticks.name, "ts",
+     "(array_agg(price ORDER BY ts))[1], max(price), min(price), (array_agg(price ORDER BY ts DESC))[1], count(*)"),
+    (price_ohlc_1h.name, "hour", price_ohlc_1m.name, "bucket",
+     "(array_agg(open ORDER BY bucket))[1], max(high), min(low), (array_agg(close ORDER BY bucket DESC))[1], "
+     "sum(ticks)"),
+    (price_ohlc_1d.name, "day", price_ohlc_1h.name, "bucket",
+     "(array_agg(open ORDER BY bucket))[1], max(high), min(low), (array_agg(close ORDER BY bucket DESC))[1], "
+     "sum(ticks)"),
+]
+UNIT_SECONDS = {"minute": 60, "hour": 60 * 60, "day": 24 * 60 * 60}
+
+
+def _partition_name(day: datetime) -> str:
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def _start_of_day(moment: datetime) -> datetime:
+    return moment.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class PriceTickWriter:
+    """
+    Buffers fetched prices in memory and writes them to price_ticks with one COPY per flush,
+    so the fetch path only appends to a list.
+    """
+
+    def __init__(self, flush_interval: int = settings.price_storage.flush_interval,
+                 max_buffered_ticks: int = settings.price_storage.max_buffered_ticks,
+                 enabled: bool = settings.price_storage.enabled):
+        self.flush_interval = flush_interval
+        self.max_buffered_ticks = max_buffered_ticks
+        self.enabled = enabled
+        self.buffer: List[Tuple[str, datetime, float]] = []
+        self.flush_task = None
+
+    def add(self, prices: Dict[str, float], fetched_at: float | None = None) -> None:
+        if not self.enabled or not prices:
+            return
+        ts = datetime.fromtimestamp(time.time() if fetched_at is None else fetched_at, tz=timezone.utc)
+        self.buffer.extend((coin_id, ts, float(price)) for coin_id, price in prices.items())
+
+        overflow = len(self.buffer) - self.max_buffered_ticks
+        if overflow > 0:
+            # The database is unavailable for a while: keep the newest ticks
+            del self.buffer[:overflow]
+            logger.warning("Price tick buffer is full, dropped %s oldest ticks.", overflow)
+
+    async def flush(self) -> None:
+        if not self.buffer:
+            return
+        records, self.buffer = self.buffer, []
+        try:
+            await self.copy(records)
+        except Exception as e:
+            # Most likely the partition of a new day is missing: create it and try once more
+            logger.warning(f"Failed to write {len(records)} price ticks, ensuring partitions: {e}")
+            try:
+                await PriceStorageMaintenance().ensure_partitions(min(record[1] for record in records))
+                await self.copy(records)
+            except Exception as e:
+                logger.error(f"Failed to write price ticks, they are kept for the next flush: {e}")
+                self.buffer[:0] = records
+
+    @staticmethod
+    async def copy(records: List[Tuple[str, datetime, float]]) -> None:
+        async with db_helper.engine.connect() as connection:
+            raw_connection = await connection.get_raw_connection()
+            # asyncpg COPY, a single round trip for the whole batch
+            await raw_connection.driver_connection.copy_records_to_table(
+                price_ticks.name, records=records, columns=[column.name for column in price_ticks.columns])
+
+    async def periodic_flush(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def start(self) -> None:
+        if self.enabled and self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.periodic_flush())
+
+    async def stop(self) -> None:
+        """Stop the flush task and write what is left in the buffer."""
+        if self.flush_task:
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+            self.flush_task = None
+        await self.flush()
+
+
+class PriceStorageMaintenance:
+    """
+    Creates price_ticks partitions ahead, builds the 1m/1h/1d OHLC rollups and applies retention.
+
+    Every process may run it: a transaction-level advisory lock lets only one of them work at a time.
+    """
+
+    def __init__(self, rollup_interval: int = settings.price_storage.rollup_interval,
+                 partitions_ahead: int = settings.price_storage.partitions_ahead,
+                 ticks_retention_days: int = settings.price_storage.ticks_retention_days,
+                 minute_rollup_retention_days: int = settings.price_storage.minute_rollup_retention_days,
+                 lock_key: int = settings.price_storage.maintenance_lock_key):
+        self.rollup_interval = rollup_interval
+        self.partitions_ahead = partitions_ahead
+        self.ticks_retention_days = ticks_retention_days
+        self.minute_rollup_retention_days = minute_rollup_retention_days
+        self.lock_key = lock_key
+        # Ticks up to this moment are rolled up; late ticks are covered by the flush lag
+        self.rolled_up_until: datetime | None = None
+        self.task = None
+
+    async def ensure_partitions(self, since: datetime | None = None) -> None:
+        """Create the daily partitions from since (today by default) up to partitions_ahead days ahead."""
+        today = _start_of_day(datetime.now(timezone.utc))
+        day = _start_of_day(since) if since else today
+        async with db_helper.engine.begin() as connection:
+            while day <= today + timedelta(days=self.partitions_ahead):
+                next_day = day + timedelta(days=1)
+                await connection.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {_partition_name(day)} PARTITION OF {price_ticks.name} "
+                    f"FOR VALUES FROM ('{day.isoformat()}') TO ('{next_day.isoformat()}')"
+                ))
+                day = next_day
+
+    async def rollup(self, connection, now: datetime) -> None:
+        lag = timedelta(seconds=settings.price_storage.flush_interval + self.rollup_interval)
+        since = (self.rolled_up_until or now - timedelta(days=1)) - lag
+        for table_name, unit, source_name, time_column, aggregates in ROLLUPS:
+            # Whole buckets are recomputed, so re-running a window is idempotent
+            bucket_since = datetime.fromtimestamp(
+                since.timestamp() // UNIT_SECONDS[unit] * UNIT_SECONDS[unit], tz=timezone.utc)
+            await connection.execute(text(
+                f"INSERT INTO {table_name} (coin_id_for_price_getter, bucket, open, high, low, close, ticks) "
+                f"SELECT coin_id_for_price_getter, "
+                f"date_trunc('{unit}', {time_column} AT TIME ZONE 'UTC') AT TIME ZONE 'UTC', {aggregates} "
+                f"FROM {source_name} WHERE {time_column} >= :since GROUP BY 1, 2 "
+                f"ON CONFLICT (coin_id_for_price_getter, bucket) DO UPDATE SET open = excluded.open, "
+                f"high = excluded.high, low = excluded.low, close = excluded.close, ticks = excluded.ticks"
+            ), {"since": bucket_since})
+        self.rolled_up_until = now
+
+    async def apply_retention(self, connection, now: datetime) -> None:
+        oldest_kept_day = _start_of_day(now) - timedelta(days=self.ticks_retention_days)
+        result = await connection.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "WHERE parent.relname = :parent"
+        ), {"parent": price_ticks.name})
+        for partition_name in result.scalars():
+            try:
+                day = datetime.strptime(partition_name[len(PARTITION_PREFIX):], "%Y%m%d").replace(tzinfo=timezone.utc)
+            except ValueError:
+                continue
+            if day < oldest_kept_day:
+                # Dropping a partition is instant and leaves no dead tuples, unlike DELETE
+                await connection.execute(text(f"DROP TABLE IF EXISTS {partition_name}"))
+                logger.info("Dropped price tick partition %s.", partition_name)
+
+        await connection.execute(delete(price_ohlc_1m).where(
+            price_ohlc_1m.c.bucket < now - timedelta(days=self.minute_rollup_retention_days)))
+
+    async def run_once(self) -> None:
+        now = datetime.now(timezone.utc)
+        try:
+            await self.ensure_partitions()
+            async with db_helper.engine.begin() as connection:
+                locked = await connection.execute(text("SELECT pg_try_advisory_xact_lock(:key)"),
+                                                  {"key": self.lock_key})
+                if not locked.scalar():
+                    return
+                await self.rollup(connection, now)
+                await self.apply_retention(connection, now)
+        except Exception as e:
+            logger.error(f"Price storage maintenance failed: {e}")
+
+    async def periodic_run(self) -> None:
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.rollup_interval)
+
+    async def start(self) -> None:
+        if settings.price_storage.enabled and self.task is None:
+            self.task = asyncio.create_task(self.periodic_run())
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+class PriceStorageService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_price_at(self, coin_id: str, moment: datetime) -> float | None:
+        """
+        Last stored price at or before the moment: raw ticks while they are retained,
+        then the close of the finest rollup bucket that ended by then.
+
+        :param coin_id: Id for the price provider (Coin.coin_id_for_price_getter)
+        :param moment: Timezone-aware moment
+        """
+        price = await self.session.scalar(
+            select(price_ticks.c.price)
+            .where(price_ticks.c.coin_id_for_price_getter == coin_id,
+                   price_ticks.c.ts <= moment,
+                   price_ticks.c.ts > moment - timedelta(days=1))
+            .order_by(price_ticks.c.ts.desc())
+            .limit(1)
+        )
+        if price is not None:
+            return price
+
+        for table, unit in ((price_ohlc_1m, "minute"), (price_ohlc_1h, "hour"), (price_ohlc_1d, "day")):
+            price = await self.session.scalar(
+                select(table.c.close)
+                .where(table.c.coin_id_for_price_getter == coin_id,
+                       table.c.bucket <= moment - timedelta(seconds=UNIT_SECONDS[unit]))
+                .order_by(table.c.bucket.desc())
+                .limit(1)
+            )
+            if price is not None:
+                return price
+        return None
+
+    async def get_ohlc(self, coin_id: str, unit: str, since: datetime) -> List[Tuple[datetime, float, float, float, float]]:
+        """
+        :param unit: minute, hour or day
+        :return: (bucket, open, high, low, close) ordered by bucket
+        """
+        table = {"minute": price_ohlc_1m, "hour": price_ohlc_1h, "day": price_ohlc_1d}[unit]
+        result = await self.session.execute(
+            select(table.c.bucket, table.c.open, table.c.high, table.c.low, table.c.close)
+            .where(table.c.coin_id_for_price_getter == coin_id, table.c.bucket >= since)
+            .order_by(table.c.bucket)
+        )
+        return [tuple(row) for row in result]
+
+
+# Global writer fed by CryptoPriceService.fetch_crypto_prices
+price_tick_writer = PriceTickWriter()
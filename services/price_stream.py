@@ -0,0 +1,147 @@
+import asyncio
+import random
+from typing import Dict, Iterable, Set
+
+import aiohttp
+import msgspec
+from yarl import URL
+
+from core import logger, settings
+from core.schemas import StreamPrices
+
+
+class PriceStreamClient:
+    """
+    Websocket price feed pushing debounced price batches into an asyncio queue.
+
+    Ticks are coalesced per coin (the latest price wins) and handed over at most once per debounce
+    interval as one {coin_id_for_price_getter: price} batch. While the consumer is behind and the
+    queue is full, ticks keep coalescing instead of piling up. The connection is re-established with
+    jittered exponential backoff when it drops, misses heartbeats or stays silent too long.
+
+    The feed uses CoinCap ids: subscribed ids are translated with the CoinGecko -> CoinCap id map and
+    ticks back, ids missing from the map are not streamed (PriceMonitor keeps polling them).
+    """
+
+    def __init__(self, url: str = settings.price_stream.url, heartbeat: float = settings.price_stream.heartbeat,
+                 stale_timeout: float = settings.price_stream.stale_timeout,
+                 debounce: float = settings.price_stream.debounce,
+                 reconnect_max_delay: float = settings.price_stream.reconnect_max_delay,
+                 queue_size: int = settings.price_stream.queue_size,
+                 id_map: Dict[str, str] = settings.price_service.coincap_id_map):
+        self.url = url
+        self.id_map = id_map
+        self.heartbeat = heartbeat
+        self.stale_timeout = stale_timeout
+        self.debounce = debounce
+        self.reconnect_max_delay = reconnect_max_delay
+        self.queue: asyncio.Queue[Dict[str, float]] = asyncio.Queue(maxsize=queue_size)
+
+        self.coin_ids: Set[str] = set()
+        # Feed id -> coin_id_for_price_getter of the subscribed coins
+        self.feed_ids: Dict[str, str] = {}
+        self.pending: Dict[str, float] = {}
+        self.connected = asyncio.Event()
+        self.resubscribe = asyncio.Event()
+        self.session: aiohttp.ClientSession | None = None
+        self.ws: aiohttp.ClientWebSocketResponse | None = None
+        self.tasks = []
+
+    @property
+    def is_connected(self) -> bool:
+        return self.connected.is_set()
+
+    def subscribe(self, coin_ids: Iterable[str]) -> None:
+        """
+        Set the streamed coins, the connection is re-established when the set changes.
+
+        :param coin_ids: coin_id_for_price_getter ids, the ones without a feed id are left out
+        """
+        coin_ids = {coin_id for coin_id in coin_ids if coin_id in self.id_map}
+        if coin_ids != self.coin_ids:
+            self.coin_ids = coin_ids
+            self.feed_ids = {self.id_map[coin_id]: coin_id for coin_id in coin_ids}
+            self.resubscribe.set()
+            if self.ws is not None and not self.ws.closed:
+                # Wakes up receive(), the loop reconnects right away with the new assets
+                asyncio.create_task(self.ws.close())
+
+    def stream_url(self) -> str:
+        return str(URL(self.url).update_query(assets=",".join(sorted(self.feed_ids))))
+
+    async def start(self) -> None:
+        if self.tasks:
+            return
+        self.session = aiohttp.ClientSession()
+        self.tasks = [asyncio.create_task(self.connection_loop()), asyncio.create_task(self.debounce_loop())]
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.connected.clear()
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def connection_loop(self) -> None:
+        attempt = 0
+        while True:
+            if not self.coin_ids:
+                await self.resubscribe.wait()
+            self.resubscribe.clear()
+
+            try:
+                async with self.session.ws_connect(self.stream_url(), heartbeat=self.heartbeat) as ws:
+                    self.ws = ws
+                    logger.info("Price stream connected, %s coins subscribed.", len(self.coin_ids))
+                    self.connected.set()
+                    attempt = 0
+                    await self.receive(ws)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Price stream connection failed: {e}")
+            finally:
+                self.ws = None
+                self.connected.clear()
+
+            if self.resubscribe.is_set():
+                continue
+            delay = random.uniform(0, min(self.reconnect_max_delay, 2 ** attempt))
+            attempt += 1
+            logger.info("Price stream disconnected, reconnecting in %.1fs.", delay)
+            await asyncio.sleep(delay)
+
+    async def receive(self, ws: aiohttp.ClientWebSocketResponse) -> None:
+        """Read messages until the connection drops, goes stale or the subscription changes."""
+        while True:
+            try:
+                message = await ws.receive(timeout=self.stale_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("No price stream messages for %ss, reconnecting.", self.stale_timeout)
+                return
+
+            if message.type == aiohttp.WSMsgType.TEXT:
+                self.handle_message(message.data)
+            elif message.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                return
+
+    def handle_message(self, data: str) -> None:
+        try:
+            ticks = msgspec.json.decode(data, type=StreamPrices, strict=False)
+        except (msgspec.ValidationError, msgspec.DecodeError) as e:
+            logger.warning(f"Malformed price stream message: {e}")
+            return
+        for feed_id, price in ticks.items():
+            coin_id = self.feed_ids.get(feed_id)
+            if coin_id is not None:
+                self.pending[coin_id] = price
+
+    async def debounce_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.debounce)
+            if self.pending and not self.queue.full():
+                batch, self.pending = self.pending, {}
+                self.queue.put_nowait(batch)
@@ -0,0 +1,278 @@
+import asyncio
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Set
+from uuid import UUID
+
+from core import settings
+from core.models import UserCoinAssociation
+
+
+def _as_uuid(value) -> UUID:
+    return value if isinstance(value, UUID) else UUID(str(value))
+
+
+@dataclass(frozen=True)
+class ThresholdEntry:
+    association_id: UUID
+    coin_id: UUID
+    chat_id: int
+    min_rate: float | None
+    max_rate: float | None
+    min_armed: bool = True
+    max_armed: bool = True
+
+
+@dataclass
+class AlertTransitions:
+    """Alert state changes of one coin at one price."""
+    fired_min: List[ThresholdEntry]
+    fired_max: List[ThresholdEntry]
+    rearmed_min: List[ThresholdEntry]
+    rearmed_max: List[ThresholdEntry]
+
+
+class SortedThresholds:
+    """
+    Thresholds of one kind for one coin, kept as two parallel lists sorted by rate.
+    """
+
+    def __init__(self):
+        self.rates: List[float] = []
+        self.association_ids: List[UUID] = []
+
+    def __len__(self):
+        return len(self.rates)
+
+    def insert(self, rate: float, association_id: UUID) -> None:
+        position = bisect_right(self.rates, rate)
+        self.rates.insert(position, rate)
+        self.association_ids.insert(position, association_id)
+
+    def remove(self, rate: float, association_id: UUID) -> bool:
+        start = bisect_left(self.rates, rate)
+        end = bisect_right(self.rates, rate)
+        for position in range(start, end):
+            if self.association_ids[position] == association_id:
+                del self.rates[position]
+                del self.association_ids[position]
+                return True
+        return False
+
+    def pop_between(self, start: int, end: int) -> List[UUID]:
+        """Remove and return the ids at positions [start, end)."""
+        association_ids = self.association_ids[start:end]
+        del self.rates[start:end]
+        del self.association_ids[start:end]
+        return association_ids
+
+
+class PriceThresholdIndex:
+    """
+    In-memory per-coin index of min_rate / max_rate thresholds and their alert state.
+
+    Armed thresholds are sorted by rate and fired ones by the price that re-arms them, so every
+    price update is answered with a few bisects per coin and only the alerts that fire or re-arm
+    are visited. Since a met armed threshold is disarmed on the spot, the armed ones met by a price
+    are exactly the ones crossed since the previous price (or added while already met).
+    """
+
+    def __init__(self, rearm_band: float = settings.price_monitor.alert_rearm_band):
+        # A fired min alert re-arms once the price rises above min_rate by this fraction of the threshold,
+        # a max alert once it falls below max_rate by it
+        self.rearm_band = rearm_band
+        self.entries: Dict[UUID, ThresholdEntry] = {}
+        self.coin_members: Dict[UUID, Set[UUID]] = {}
+        # Every threshold by rate, for the distance to the nearest one
+        self.min_thresholds: Dict[UUID, SortedThresholds] = {}
+        self.max_thresholds: Dict[UUID, SortedThresholds] = {}
+        # Thresholds whose alert may fire, by rate
+        self.min_armed: Dict[UUID, SortedThresholds] = {}
+        self.max_armed: Dict[UUID, SortedThresholds] = {}
+        # Thresholds whose alert fired and waits for re-arming, by re-arm price
+        self.min_disarmed: Dict[UUID, SortedThresholds] = {}
+        self.max_disarmed: Dict[UUID, SortedThresholds] = {}
+        self.is_loaded = False
+        # Coins whose watchers changed since the monitor last looked, see pop_changed_coins()
+        self.changed_coins: Set[UUID] = set()
+        # Set while changed_coins is not empty, wakes up a monitor waiting for its next poll
+        self.changed = asyncio.Event()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def rebuild(self, entries: Iterable[ThresholdEntry]) -> None:
+        """Replace the whole index, e.g. after loading all associations from the database."""
+        self.entries.clear()
+        self.coin_members.clear()
+        for thresholds in (self.min_thresholds, self.max_thresholds, self.min_armed, self.max_armed,
+                           self.min_disarmed, self.max_disarmed):
+            thresholds.clear()
+        self.changed_coins.clear()
+        self.changed.clear()
+        for entry in entries:
+            self._insert(entry)
+        self.is_loaded = True
+
+    def upsert(self, association: UserCoinAssociation, chat_id: int) -> bool:
+        """
+        Add or replace the thresholds of an association after a user edits it.
+
+        :return: False when the association is already indexed with the same thresholds; its alert
+            state in the index is then kept, it is newer than the stored one during a cycle
+        """
+        entry = ThresholdEntry(
+            association_id=_as_uuid(association.id),
+            coin_id=_as_uuid(association.coin_id),
+            chat_id=chat_id,
+            min_rate=association.min_rate,
+            max_rate=association.max_rate,
+            min_armed=association.min_alert_armed is not False,
+            max_armed=association.max_alert_armed is not False,
+        )
+        existing = self.entries.get(entry.association_id)
+        if existing is not None and (existing.coin_id, existing.chat_id, existing.min_rate, existing.max_rate) == (
+                entry.coin_id, entry.chat_id, entry.min_rate, entry.max_rate):
+            return False
+        self.discard(entry.association_id)
+        self._insert(entry)
+        self.mark_changed(entry.coin_id)
+        return True
+
+    def discard(self, association_id) -> None:
+        entry = self.entries.pop(_as_uuid(association_id), None)
+        if entry is None:
+            return
+
+        self.coin_members[entry.coin_id].discard(entry.association_id)
+        self.mark_changed(entry.coin_id)
+        if entry.min_rate:
+            self.min_thresholds[entry.coin_id].remove(entry.min_rate, entry.association_id)
+            if not self.min_armed[entry.coin_id].remove(entry.min_rate, entry.association_id):
+                self.min_disarmed[entry.coin_id].remove(self.min_rearm_price(entry), entry.association_id)
+        if entry.max_rate:
+            self.max_thresholds[entry.coin_id].remove(entry.max_rate, entry.association_id)
+            if not self.max_armed[entry.coin_id].remove(entry.max_rate, entry.association_id):
+                self.max_disarmed[entry.coin_id].remove(self.max_rearm_price(entry), entry.association_id)
+
+    def discard_user_coin(self, chat_id: int, coin_id) -> None:
+        """Drop every association of a user for a coin."""
+        coin_id = _as_uuid(coin_id)
+        for association_id in list(self.coin_members.get(coin_id, ())):
+            if self.entries[association_id].chat_id == chat_id:
+                self.discard(association_id)
+
+    def mark_changed(self, coin_id: UUID) -> None:
+        self.changed_coins.add(coin_id)
+        self.changed.set()
+
+    def pop_changed_coins(self) -> Set[UUID]:
+        """Coins whose thresholds were added, edited or removed since the last call."""
+        changed, self.changed_coins = self.changed_coins, set()
+        self.changed.clear()
+        return changed
+
+    def watcher_count(self, coin_id) -> int:
+        return len(self.coin_members.get(_as_uuid(coin_id), ()))
+
+    def nearest_threshold_distance(self, coin_id, price: float) -> float | None:
+        """
+        Relative distance from the price to the closest threshold that is not met yet:
+        the highest min_rate below the price or the lowest max_rate above it.
+        """
+        coin_id = _as_uuid(coin_id)
+        distances = []
+
+        min_thresholds = self.min_thresholds.get(coin_id)
+        if min_thresholds:
+            position = bisect_left(min_thresholds.rates, price)
+            if position:
+                distances.append(price - min_thresholds.rates[position - 1])
+
+        max_thresholds = self.max_thresholds.get(coin_id)
+        if max_thresholds:
+            position = bisect_right(max_thresholds.rates, price)
+            if position < len(max_thresholds):
+                distances.append(max_thresholds.rates[position] - price)
+
+        if not distances or not price:
+            return None
+        return min(distances) / abs(price)
+
+    def min_rearm_price(self, entry: ThresholdEntry) -> float:
+        return entry.min_rate + abs(entry.min_rate) * self.rearm_band
+
+    def max_rearm_price(self, entry: ThresholdEntry) -> float:
+        return entry.max_rate - abs(entry.max_rate) * self.rearm_band
+
+    def apply_price(self, coin_id, price: float) -> AlertTransitions:
+        """
+        Fire the armed alerts whose thresholds are met and re-arm the fired ones the price has left.
+
+        A min alert fires at price <= min_rate and is re-armed once the price rises above min_rate by
+        more than rearm_band, a max alert fires at price >= max_rate and is re-armed once the price falls
+        below max_rate by more than that. Costs O(log n + transitions) per coin: only the thresholds
+        that change state are visited. The new state is kept in the index; the caller persists the
+        returned transitions.
+        """
+        coin_id = _as_uuid(coin_id)
+        rearmed_min, rearmed_max, fired_min, fired_max = [], [], [], []
+
+        min_disarmed = self.min_disarmed.get(coin_id)
+        if min_disarmed:
+            rearmed_min = [self.entries[i] for i in min_disarmed.pop_between(
+                0, bisect_left(min_disarmed.rates, price))]
+        max_disarmed = self.max_disarmed.get(coin_id)
+        if max_disarmed:
+            rearmed_max = [self.entries[i] for i in max_disarmed.pop_between(
+                bisect_right(max_disarmed.rates, price), len(max_disarmed))]
+        for entry in rearmed_min:
+            self.min_armed[coin_id].insert(entry.min_rate, entry.association_id)
+        for entry in rearmed_max:
+            self.max_armed[coin_id].insert(entry.max_rate, entry.association_id)
+
+        min_armed = self.min_armed.get(coin_id)
+        if min_armed:
+            fired_min = [self.entries[i] for i in min_armed.pop_between(
+                bisect_left(min_armed.rates, price), len(min_armed))]
+        max_armed = self.max_armed.get(coin_id)
+        if max_armed:
+            fired_max = [self.entries[i] for i in max_armed.pop_between(0, bisect_right(max_armed.rates, price))]
+        for entry in fired_min:
+            self.min_disarmed.setdefault(coin_id, SortedThresholds()).insert(
+                self.min_rearm_price(entry), entry.association_id)
+        for entry in fired_max:
+            self.max_disarmed.setdefault(coin_id, SortedThresholds()).insert(
+                self.max_rearm_price(entry), entry.association_id)
+
+        return AlertTransitions(fired_min=fired_min, fired_max=fired_max,
+                                rearmed_min=rearmed_min, rearmed_max=rearmed_max)
+
+    def _insert(self, entry: ThresholdEntry) -> None:
+        # Associations without thresholds are kept too, they count as watchers of the coin.
+        # Same truthiness as PriceMonitor.check_price_conditions: 0 / None mean "not set"
+        self.entries[entry.association_id] = entry
+        self.coin_members.setdefault(entry.coin_id, set()).add(entry.association_id)
+        if entry.min_rate:
+            self.min_thresholds.setdefault(entry.coin_id, SortedThresholds()).insert(
+                entry.min_rate, entry.association_id)
+            # Both structures exist once the coin has a threshold, discard() relies on it
+            min_armed = self.min_armed.setdefault(entry.coin_id, SortedThresholds())
+            min_disarmed = self.min_disarmed.setdefault(entry.coin_id, SortedThresholds())
+            if entry.min_armed:
+                min_armed.insert(entry.min_rate, entry.association_id)
+            else:
+                min_disarmed.insert(self.min_rearm_price(entry), entry.association_id)
+        if entry.max_rate:
+            self.max_thresholds.setdefault(entry.coin_id, SortedThresholds()).insert(
+                entry.max_rate, entry.association_id)
+            max_armed = self.max_armed.setdefault(entry.coin_id, SortedThresholds())
+            max_disarmed = self.max_disarmed.setdefault(entry.coin_id, SortedThresholds())
+            if entry.max_armed:
+                max_armed.insert(entry.max_rate, entry.association_id)
+            else:
+                max_disarmed.insert(self.max_rearm_price(entry), entry.association_id)
+
+
+# Global index shared by PriceMonitor and the portfolio handlers
+price_threshold_index = PriceThresholdIndex()
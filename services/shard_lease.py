@@ -0,0 +1,185 @@
+import asyncio
+import math
+import random
+from dataclasses import dataclass
+from typing import FrozenSet, Set
+
+from sqlalchemy import text, func
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from core import logger, settings
+
+
+@dataclass(frozen=True)
+class ShardFilter:
+    """Set of monitor shards owned by a worker, users are partitioned by abs(chat_id) % total_shards."""
+    total_shards: int
+    shards: FrozenSet[int]
+
+    def owns(self, chat_id: int) -> bool:
+        return abs(chat_id) % self.total_shards in self.shards
+
+    def clause(self, chat_id_column):
+        """SQL condition selecting the rows of the owned shards."""
+        return (func.abs(chat_id_column) % self.total_shards).in_(self.shards)
+
+
+async def count_live_workers(connection: AsyncConnection | AsyncSession,
+                             lock_namespace: int = settings.price_monitor.lease_lock_namespace,
+                             total_shards: int = settings.price_monitor.total_shards) -> int:
+    """Number of running monitor workers, every worker holds one presence lock above the shard keys."""
+    result = await connection.execute(
+        text("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND granted AND objsubid = 2 "
+             "AND classid::bigint = :namespace AND objid::bigint >= :total_shards"),
+        {"namespace": lock_namespace, "total_shards": total_shards}
+    )
+    return int(result.scalar())
+
+
+class ShardLeaseManager:
+    """
+    Claims monitor shards with Postgres session-level advisory locks.
+
+    Locks live as long as the dedicated connection. It is not pooled: closing it always ends the database
+    session and releases its locks instead of handing them to another pool user. When a worker dies its
+    shards are released and picked up by the other workers on their next renewal. Every worker also holds a
+    presence lock, so the workers know how many of them are alive: each one keeps at most its fair share
+    ceil(total_shards / live workers) and releases the rest when a worker joins. A shard that stays orphaned
+    for a whole renewal interval is claimed beyond the share.
+    """
+
+    def __init__(self, total_shards: int = settings.price_monitor.total_shards,
+                 max_shards_per_worker: int = settings.price_monitor.max_shards_per_worker,
+                 renew_interval: int = settings.price_monitor.lease_renew_interval,
+                 lock_namespace: int = settings.price_monitor.lease_lock_namespace):
+        self.total_shards = total_shards
+        # Hard cap on top of the fair share, 0 for none
+        self.max_shards = max_shards_per_worker or total_shards
+        self.renew_interval = renew_interval
+        self.lock_namespace = lock_namespace
+        self.engine = create_async_engine(url=str(settings.db.url), echo=settings.db.echo, poolclass=NullPool)
+        self.connection: AsyncConnection | None = None
+        self.owned: Set[int] = set()
+        self.presence_key: int | None = None
+        self.orphans_seen: Set[int] = set()
+        self.renew_task = None
+
+    def shard_filter(self) -> ShardFilter:
+        return ShardFilter(total_shards=self.total_shards, shards=frozenset(self.owned))
+
+    def owns(self, chat_id: int) -> bool:
+        """Whether the user is still in an owned shard, checked right before a notification is sent."""
+        return self.shard_filter().owns(chat_id)
+
+    async def start(self):
+        """Claim the first shards and start the renewal task."""
+        await self.renew()
+        if self.renew_task is None:
+            self.renew_task = asyncio.create_task(self.periodic_renew())
+
+    async def periodic_renew(self) -> None:
+        while True:
+            await asyncio.sleep(self.renew_interval)
+            await self.renew()
+
+    async def connect(self) -> None:
+        self.connection = await self.engine.connect()
+        await self.connection.execution_options(isolation_level="AUTOCOMMIT")
+        # Keys above the shard numbers identify workers
+        while self.presence_key is None:
+            key = random.randint(self.total_shards, 2 ** 31 - 1)
+            if await self.try_lock(key):
+                self.presence_key = key
+
+    def fair_share(self, live_workers: int) -> int:
+        return min(self.max_shards, math.ceil(self.total_shards / max(1, live_workers)))
+
+    async def renew(self) -> None:
+        """Check that the lock connection is alive and claim free shards."""
+        try:
+            if self.connection is None:
+                await self.connect()
+            else:
+                await self.connection.execute(text("SELECT 1"))
+        except Exception as e:
+            logger.error(f"Shard lease connection lost, all shards released: {e}")
+            self.owned.clear()
+            self.orphans_seen.clear()
+            await self.close_connection(invalidate=True)
+            return
+
+        try:
+            share = self.fair_share(await count_live_workers(self.connection, self.lock_namespace, self.total_shards))
+            # A worker joined: give the shards above the share back, the newcomer claims them on its renewal
+            for shard in sorted(self.owned, reverse=True)[:max(0, len(self.owned) - share)]:
+                self.owned.discard(shard)
+                await self.unlock(shard)
+                logger.info("Released monitor shard %s to rebalance (%s owned).", shard, len(self.owned))
+
+            orphans = set()
+            for shard in range(self.total_shards):
+                if shard in self.owned or not await self.try_lock(shard):
+                    continue
+
+                if len(self.owned) < share or shard in self.orphans_seen:
+                    self.owned.add(shard)
+                    logger.info("Claimed monitor shard %s (%s owned).", shard, len(self.owned))
+                else:
+                    # Over our share: leave it to other workers unless nobody takes it until next renewal
+                    orphans.add(shard)
+                    await self.unlock(shard)
+            self.orphans_seen = orphans
+        except Exception as e:
+            # The locks held by the connection are unknown now: drop it with all of them and start over
+            logger.error(f"Failed to renew shard leases, all shards released: {e}")
+            self.owned.clear()
+            self.orphans_seen.clear()
+            await self.close_connection(invalidate=True)
+
+    async def try_lock(self, shard: int) -> bool:
+        result = await self.connection.execute(
+            text("SELECT pg_try_advisory_lock(:namespace, :shard)"),
+            {"namespace": self.lock_namespace, "shard": shard}
+        )
+        return bool(result.scalar())
+
+    async def unlock(self, shard: int) -> None:
+        await self.connection.execute(
+            text("SELECT pg_advisory_unlock(:namespace, :shard)"),
+            {"namespace": self.lock_namespace, "shard": shard}
+        )
+
+    async def close_connection(self, invalidate: bool = False) -> None:
+        """
+        :param invalidate: The connection is broken or in an unknown state, discard it without a reset
+        """
+        if self.connection is not None:
+            try:
+                if invalidate:
+                    await self.connection.invalidate()
+                await self.connection.close()
+            except Exception as e:
+                logger.error(f"Failed to close shard lease connection: {e}")
+            self.connection = None
+            self.presence_key = None
+
+    async def stop(self) -> None:
+        """Stop renewing and release every shard."""
+        if self.renew_task:
+            self.renew_task.cancel()
+            try:
+                await self.renew_task
+            except asyncio.CancelledError:
+                pass
+            self.renew_task = None
+
+        if self.connection is not None:
+            try:
+                await self.connection.execute(text("SELECT pg_advisory_unlock_all()"))
+            except Exception as e:
+                logger.error(f"Failed to release shard leases: {e}")
+        await self.close_connection()
+        await self.engine.dispose()
+        self.owned.clear()
+        logger.info("All monitor shards released.")
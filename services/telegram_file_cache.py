@@ -0,0 +1,149 @@
+import asyncio
+import os
+import random
+import tempfile
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict
+
+import msgspec
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message
+
+from core import logger, settings
+
+
+class TelegramFileIdCache:
+    """
+    Bounded LRU of image URL -> Telegram file_id.
+
+    The first send of an image passes the URL and Telegram downloads it; the file_id of the sent photo is
+    remembered and later sends of the same image reference the already uploaded file. Concurrent first
+    sends of one URL (a notification fan-out) wait for a single upload instead of all downloading it.
+    The cache is optionally persisted to a msgpack file, file_ids stay valid for the same bot token.
+    Every process writes through its own temporary file, processes sharing a path never mix their writes.
+    """
+
+    def __init__(self, max_entries: int = settings.cat_image.file_id_cache_size,
+                 path: str = settings.cat_image.file_id_cache_file):
+        self.max_entries = max_entries
+        self.path_template = path
+        self.path = path.replace("{role}", "bot")
+        self.file_ids: OrderedDict[str, str] = OrderedDict()
+        self.uploads: Dict[str, asyncio.Future] = {}
+        self.dirty = False
+        self.save_task: asyncio.Task | None = None
+
+    def get(self, url: str) -> str | None:
+        file_id = self.file_ids.get(url)
+        if file_id is not None:
+            self.file_ids.move_to_end(url)
+        return file_id
+
+    def random_url(self) -> str | None:
+        """URL of a random already uploaded image, sending it again costs no upload."""
+        return random.choice(list(self.file_ids)) if self.file_ids else None
+
+    def remember(self, url: str, message: Message) -> None:
+        if not message.photo:
+            return
+        # Sizes are ordered from the smallest, the last one is the original upload
+        self.file_ids[url] = message.photo[-1].file_id
+        self.file_ids.move_to_end(url)
+        while len(self.file_ids) > self.max_entries:
+            self.file_ids.popitem(last=False)
+        self.schedule_save()
+
+    def forget(self, url: str) -> None:
+        if self.file_ids.pop(url, None) is not None:
+            self.schedule_save()
+
+    async def send(self, url: str, send_photo: Callable[[str], Awaitable[Message]]) -> Message:
+        """
+        Send a photo by its cached file_id, falling back to the URL and remembering the new file_id.
+
+        :param url: Image URL
+        :param send_photo: Sends the photo given a file_id or a URL, e.g. a message.answer_photo wrapper
+        :return: The sent message
+        """
+        upload = self.uploads.get(url)
+        if upload is not None and self.get(url) is None:
+            # Another send is uploading this image right now, its file_id comes shortly
+            await asyncio.wait({upload})
+
+        file_id = self.get(url)
+        if file_id is not None:
+            try:
+                return await send_photo(file_id)
+            except TelegramBadRequest as e:
+                logger.warning(f"Cached file_id of {url} was rejected, sending the URL: {e}")
+                self.forget(url)
+
+        upload = None
+        if url not in self.uploads:
+            upload = self.uploads[url] = asyncio.get_running_loop().create_future()
+        try:
+            message = await send_photo(url)
+            self.remember(url, message)
+            return message
+        finally:
+            if upload is not None:
+                del self.uploads[url]
+                upload.set_result(None)
+
+    def load(self, role: str = "bot") -> int:
+        """
+        Load the persisted file_ids of the process role, later saves go to the same file.
+
+        :param role: "bot" or "worker", replaces {role} in the path
+        :return: Number of loaded file_ids
+        """
+        self.path = self.path_template.replace("{role}", role)
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, "rb") as file:
+                file_ids = msgspec.msgpack.decode(file.read(), type=Dict[str, str])
+        except (OSError, msgspec.DecodeError, msgspec.ValidationError) as e:
+            logger.warning(f"Failed to load Telegram file_id cache {self.path}: {e}")
+            return 0
+        # Persisted from the least recently used, the newest entries win when the limit shrank
+        for url, file_id in list(file_ids.items())[-self.max_entries:]:
+            self.file_ids[url] = file_id
+        logger.info("Loaded %s Telegram file_ids from %s.", len(self.file_ids), self.path)
+        return len(self.file_ids)
+
+    def schedule_save(self) -> None:
+        if not self.path:
+            return
+        self.dirty = True
+        if self.save_task is None or self.save_task.done():
+            self.save_task = asyncio.create_task(self.save_loop())
+
+    async def save_loop(self) -> None:
+        while self.dirty:
+            self.dirty = False
+            try:
+                await asyncio.to_thread(self.write, dict(self.file_ids))
+            except OSError as e:
+                logger.error(f"Failed to save Telegram file_id cache {self.path}: {e}")
+
+    def write(self, file_ids: Dict[str, str]) -> None:
+        # Unique per write and in the same directory, so the replace below stays on one filesystem
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".",
+                                                      prefix=f"{os.path.basename(self.path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(msgspec.msgpack.encode(file_ids))
+            os.replace(temporary_path, self.path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    async def stop(self) -> None:
+        """Wait for a pending save."""
+        if self.save_task:
+            await self.save_task
+
+
+# Global cache of cat photos sent by /meow and PriceMonitor
+cat_photo_file_ids = TelegramFileIdCache()
@@ -1,9 +1,13 @@
-from typing import List, Tuple
+from datetime import datetime
+from typing import AsyncContextManager, AsyncIterator, Callable, Collection, Dict, List, Tuple, TYPE_CHECKING
 from uuid import UUID
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from core.models import TGUser, UserCoinAssociation, Coin
+from sqlalchemy import select, update, bindparam, or_, tuple_, func
+from core.models import db_helper, TGUser, UserCoinAssociation, Coin
+
+if TYPE_CHECKING:
+    from services.shard_lease import ShardFilter
 
 
 class UserService:
@@ -20,11 +24,6 @@ class UserService:
         result = await self.session.execute(select(TGUser).where(TGUser.chat_id == chat_id))
         return result.scalar_one_or_none()
 
-    async def get_all_users(self) -> list[TGUser]:
-        result = await self.session.execute(select(TGUser))
-        result = result.scalars().unique().all()
-        return [user for user in result]
-
     async def is_superuser(self, chat_id: int) -> bool:
         user = await self.get_user(chat_id)
         return user is not None and user.is_superuser
@@ -49,6 +48,128 @@ class UserService:
         result = [(coin, association) for coin, association in result]
         return result
 
+    async def get_users_page(self, after_id: UUID | None = None, batch_size: int = 1000) -> List[TGUser]:
+        """
+        One page of users ordered by the primary key (keyset pagination).
+
+        :param after_id: Id of the last user of the previous page, None for the first page
+        :param batch_size: Number of users per page
+        :return: Users of the page, fewer than batch_size on the last page
+        """
+        stmt = select(TGUser).order_by(TGUser.id).limit(batch_size)
+        if after_id is not None:
+            stmt = stmt.where(TGUser.id > after_id)
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def iter_users(batch_size: int = 1000,
+                         session_factory: Callable[[], AsyncContextManager[AsyncSession]] = db_helper.db_session
+                         ) -> AsyncIterator[TGUser]:
+        """
+        Iterate over all users with keyset pagination. Every page is read in its own short session,
+        so no connection or transaction stays open while the caller works on the users, e.g. sends messages.
+
+        :param batch_size: Number of users per page
+        :param session_factory: Opens the session of one page
+        """
+        last_id = None
+        while True:
+            users = []
+            async with session_factory() as session:
+                users = await UserService(session).get_users_page(last_id, batch_size)
+            for user in users:
+                yield user
+            if len(users) < batch_size:
+                return
+            last_id = users[-1].id
+
+    async def iter_associations(self, percentage_rules_only: bool = False, shard_filter: "ShardFilter" = None,
+                                coin_ids: Collection[UUID] = None, association_ids: Collection[UUID] = None,
+                                updated_since: datetime = None, batch_size: int = 1000
+                                ) -> AsyncIterator[Tuple[Coin, UserCoinAssociation, int]]:
+        """
+        Iterate over every active association together with its coin and the owner's chat_id,
+        page by page using keyset pagination on the association primary key.
+
+        :param percentage_rules_only: Only rows with a growth or decline percentage set
+        :param shard_filter: Only rows of users in the given monitor shards
+        :param coin_ids: Only rows of the given coins (Coin.id)
+        :param association_ids: Only the given rows (UserCoinAssociation.id)
+        :param updated_since: Only rows edited after this moment
+        :param batch_size: Number of rows fetched per query
+        :return: Async iterator of (coin, association, chat_id) rows
+        """
+        primary_key = tuple_(UserCoinAssociation.user_id, UserCoinAssociation.coin_id, UserCoinAssociation.id)
+        base_stmt = (
+            select(Coin, UserCoinAssociation, TGUser.chat_id)
+            .join(UserCoinAssociation, Coin.id == UserCoinAssociation.coin_id)
+            .join(TGUser, TGUser.id == UserCoinAssociation.user_id)
+            .where(Coin.is_active == True)
+            .where(Coin.coin_id_for_price_getter.isnot(None))
+            .where(UserCoinAssociation.is_active == True)
+            .where(TGUser.is_active == True)
+            .order_by(UserCoinAssociation.user_id, UserCoinAssociation.coin_id, UserCoinAssociation.id)
+            .limit(batch_size)
+        )
+        if percentage_rules_only:
+            base_stmt = base_stmt.where(or_(UserCoinAssociation.rate_percentage_growth.isnot(None),
+                                            UserCoinAssociation.rate_percentage_declines.isnot(None)))
+        if shard_filter is not None:
+            base_stmt = base_stmt.where(shard_filter.clause(TGUser.chat_id))
+        if coin_ids is not None:
+            base_stmt = base_stmt.where(UserCoinAssociation.coin_id.in_(coin_ids))
+        if association_ids is not None:
+            base_stmt = base_stmt.where(UserCoinAssociation.id.in_(association_ids))
+        if updated_since is not None:
+            base_stmt = base_stmt.where(UserCoinAssociation.updated_at > updated_since)
+
+        last_key = None
+        while True:
+            stmt = base_stmt if last_key is None else base_stmt.where(primary_key > tuple_(*last_key))
+            result = await self.session.execute(stmt)
+            rows = result.all()
+            for coin, association, chat_id in rows:
+                yield coin, association, chat_id
+
+            if len(rows) < batch_size:
+                return
+            last_association = rows[-1][1]
+            last_key = (last_association.user_id, last_association.coin_id, last_association.id)
+
+    async def get_alert_rule_rows(self, coin_ids: Collection[UUID], percentage_rules_only: bool = False,
+                                  shard_filter: "ShardFilter" = None) -> List[Tuple]:
+        """
+        Rule columns of the active associations of the given coins as plain tuples, no ORM objects are built.
+
+        :param coin_ids: Only rows of these coins (Coin.id)
+        :param percentage_rules_only: Only rows with a growth or decline percentage set
+        :param shard_filter: Only rows of users in the given monitor shards
+        :return: (association_id, coin_id, chat_id, min_rate, max_rate, rate_percentage_growth,
+            rate_percentage_declines, saved_rate_to_compare) rows, see services.alert_snapshot
+        """
+        associations = UserCoinAssociation.__table__
+        stmt = (
+            select(associations.c.id, associations.c.coin_id, TGUser.chat_id, associations.c.min_rate,
+                   associations.c.max_rate, associations.c.rate_percentage_growth,
+                   associations.c.rate_percentage_declines, associations.c.saved_rate_to_compare)
+            .join(TGUser, TGUser.id == associations.c.user_id)
+            .where(associations.c.coin_id.in_(coin_ids))
+            .where(associations.c.is_active == True)
+            .where(TGUser.is_active == True)
+        )
+        if percentage_rules_only:
+            stmt = stmt.where(or_(associations.c.rate_percentage_growth.isnot(None),
+                                  associations.c.rate_percentage_declines.isnot(None)))
+        if shard_filter is not None:
+            stmt = stmt.where(shard_filter.clause(TGUser.chat_id))
+        result = await self.session.execute(stmt)
+        return [tuple(row) for row in result]
+
+    async def get_database_time(self) -> datetime:
+        """Current time of the database server, a watermark for updated_at comparisons."""
+        return await self.session.scalar(select(func.now()))
+
     async def update_user_coin(self, chat_id: int, coin_id: UUID, association_id: UUID, **kwargs) -> bool:
         user = await self.get_user(chat_id)
         if not user:
@@ -67,6 +188,68 @@ class UserService:
             return True
         return False
 
+    async def bulk_update_saved_rates(self, prices_by_coin_id: Dict[UUID, float],
+                                      shard_filter: "ShardFilter" = None) -> None:
+        """
+        Refresh saved_rate_to_compare for all watchers of each coin with a single executemany UPDATE.
+        Rows that already hold the current price are left untouched.
+
+        :param prices_by_coin_id: Current price keyed by Coin.id
+        :param shard_filter: Only rows of users in the given monitor shards
+        """
+        if not prices_by_coin_id:
+            return
+
+        associations = UserCoinAssociation.__table__
+        stmt = (
+            update(associations)
+            .where(associations.c.coin_id == bindparam("b_coin_id"))
+            .where(associations.c.is_active == True)
+            .where(associations.c.saved_rate_to_compare.is_distinct_from(bindparam("b_price")))
+            # Monitor bookkeeping is not a user edit, updated_at keeps driving the threshold index delta
+            .values(saved_rate_to_compare=bindparam("b_price"), updated_at=associations.c.updated_at)
+        )
+        if shard_filter is not None:
+            stmt = stmt.where(associations.c.user_id.in_(
+                select(TGUser.id).where(shard_filter.clause(TGUser.chat_id))))
+        await self.session.execute(
+            stmt,
+            [{"b_coin_id": coin_id, "b_price": price} for coin_id, price in prices_by_coin_id.items()]
+        )
+        await self.session.commit()
+
+    async def bulk_update_alert_states(self, armed_column: str, armed: bool,
+                                       prices_by_association_id: Dict[UUID, float]) -> None:
+        """
+        Arm or disarm the min / max alert of many associations with a single executemany UPDATE.
+        Disarming means the alert just fired, so the price and time are stored as the last alert.
+
+        :param armed_column: "min_alert_armed" or "max_alert_armed"
+        :param armed: New state of the alert
+        :param prices_by_association_id: Price of the transition keyed by UserCoinAssociation.id
+        """
+        if not prices_by_association_id:
+            return
+
+        associations = UserCoinAssociation.__table__
+        # Monitor bookkeeping is not a user edit, updated_at keeps driving the threshold index delta
+        values = {armed_column: armed, "updated_at": associations.c.updated_at}
+        if not armed:
+            values.update(last_alert_price=bindparam("b_price"), last_alert_at=func.now())
+
+        stmt = (
+            update(associations)
+            .where(associations.c.id == bindparam("b_id"))
+            .values(**values)
+        )
+        if armed:
+            params = [{"b_id": association_id} for association_id in prices_by_association_id]
+        else:
+            params = [{"b_id": association_id, "b_price": price}
+                      for association_id, price in prices_by_association_id.items()]
+        await self.session.execute(stmt, params)
+        await self.session.commit()
+
     async def remove_coin_from_user(self, chat_id: int, coin_id: UUID) -> bool:
         user = await self.get_user(chat_id)
         if not user:
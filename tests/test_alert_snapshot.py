@@ -0,0 +1,74 @@
+import random
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from services.alert_snapshot import AlertSnapshot
+from services.price_monitoring_service import PriceMonitor
+
+
+def random_rule(generator: random.Random, low: float, high: float) -> float | None:
+    # Unset rules come as None or 0, both mean "not set"
+    return generator.choice([None, 0.0, round(generator.uniform(low, high), 2)])
+
+
+def vectorized_conditions(snapshot: AlertSnapshot, evaluation, row: int):
+    coin = snapshot.coins[snapshot.coin_index[row]]
+    price = evaluation.price[row]
+    conditions = []
+    if evaluation.min_hit[row]:
+        conditions.append(PriceMonitor.min_rate_condition(coin, snapshot.min_rate[row], price))
+    if evaluation.max_hit[row]:
+        conditions.append(PriceMonitor.max_rate_condition(coin, snapshot.max_rate[row], price))
+    if evaluation.growth_hit[row]:
+        conditions.append(PriceMonitor.growth_condition(coin, evaluation.growth[row],
+                                                        snapshot.rate_percentage_growth[row]))
+    if evaluation.decline_hit[row]:
+        conditions.append(PriceMonitor.decline_condition(coin, evaluation.decline[row],
+                                                         snapshot.rate_percentage_declines[row]))
+    return conditions
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_vectorized_evaluation_matches_scalar_reference(seed):
+    generator = random.Random(seed)
+    coins = [SimpleNamespace(id=uuid.uuid4(), code=f"C{i}", coin_id_for_price_getter=f"coin-{i}") for i in range(8)]
+    # The last coin has no price in this tick, its rows must never hit
+    current_prices = {coin.coin_id_for_price_getter: generator.uniform(50, 150) for coin in coins[:-1]}
+
+    associations, rows = [], []
+    for _ in range(500):
+        coin = generator.choice(coins)
+        association = SimpleNamespace(
+            id=uuid.uuid4(),
+            min_rate=random_rule(generator, 50, 150),
+            max_rate=random_rule(generator, 50, 150),
+            rate_percentage_growth=random_rule(generator, 0.5, 30),
+            rate_percentage_declines=random_rule(generator, 0.5, 30),
+            saved_rate_to_compare=random_rule(generator, 50, 150),
+        )
+        chat_id = generator.randint(-10 ** 12, 10 ** 12)
+        associations.append((coin, association, chat_id))
+        rows.append((association.id, coin.id, chat_id, association.min_rate, association.max_rate,
+                     association.rate_percentage_growth, association.rate_percentage_declines,
+                     association.saved_rate_to_compare))
+
+    snapshot = AlertSnapshot.from_columns(coins, rows)
+    evaluation = snapshot.evaluate(current_prices)
+
+    assert len(snapshot) == len(rows)
+    for row, (coin, association, chat_id) in enumerate(associations):
+        assert snapshot.association_ids[row] == association.id
+        assert snapshot.chat_id[row] == chat_id
+        current_price = current_prices.get(coin.coin_id_for_price_getter)
+        expected = [] if current_price is None else PriceMonitor.check_price_conditions(
+            coin, association, current_price)
+        assert vectorized_conditions(snapshot, evaluation, row) == expected
+
+
+def test_empty_snapshot():
+    snapshot = AlertSnapshot.from_columns([], [])
+    evaluation = snapshot.evaluate({"bitcoin": 1.0})
+    assert len(snapshot) == 0
+    assert not evaluation.growth_hit.any()
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from core import settings
+from core.models.http_helper import ClientManager, ClientPoolTimeout
+
+HOST = "127.0.0.1"
+
+
+async def slow_handler(request: web.Request) -> web.Response:
+    await asyncio.sleep(float(request.query.get("delay", "0")))
+    return web.Response(text="ok")
+
+
+async def start_server() -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/", slow_handler)
+    runner = web.AppRunner(app, shutdown_timeout=0.5)
+    await runner.setup()
+    await web.TCPSite(runner, HOST, 0).start()
+    return runner
+
+
+async def run_local_and_upstream_timeouts():
+    runner = await start_server()
+    url = f"http://{HOST}:{runner.addresses[0][1]}/"
+    manager = ClientManager(shared_sessions=True, acquire_timeout=0.2, request_timeout=0.5, rate_limits={})
+    breaker = manager.circuit_breaker(HOST)
+    try:
+        # The only connection is busy: the second request times out waiting for it without reaching the host
+        busy = asyncio.create_task(manager.send("GET", url, HOST, params={"delay": "0.4"}))
+        await asyncio.sleep(0.05)
+        with pytest.raises(ClientPoolTimeout):
+            await manager.send("GET", url, HOST)
+        assert breaker.failures == 0
+        (await busy).release()
+        assert breaker.failures == 0
+
+        # The host answering too slowly is an upstream failure
+        with pytest.raises(asyncio.TimeoutError) as error:
+            await manager.send("GET", url, HOST, params={"delay": "1"})
+        assert not isinstance(error.value, ClientPoolTimeout)
+        assert breaker.failures == 1
+    finally:
+        await manager.dispose_all_clients()
+        await runner.cleanup()
+
+
+def test_local_pool_timeouts_do_not_trip_the_breaker(monkeypatch):
+    monkeypatch.setattr(settings.http_client, "connector_limit_per_host", 1)
+    asyncio.run(run_local_and_upstream_timeouts())
@@ -0,0 +1,39 @@
+import uuid
+from collections import defaultdict
+from types import SimpleNamespace
+
+from services.alert_snapshot import AlertSnapshot
+from services.price_monitoring_service import PriceMonitor
+
+
+def make_monitor() -> PriceMonitor:
+    return PriceMonitor(bot=None, update_interval=300, stream_enabled=False)
+
+
+def evaluate(monitor: PriceMonitor, snapshot: AlertSnapshot, price: float):
+    notifications = defaultdict(list)
+    monitor.collect_percentage_notifications(snapshot, {"bitcoin": price}, notifications)
+    return notifications
+
+
+def test_percentage_rule_fires_once_per_baseline_window():
+    monitor = make_monitor()
+    coin = SimpleNamespace(id=uuid.uuid4(), code="BTC", coin_id_for_price_getter="bitcoin")
+    association_id = uuid.uuid4()
+    # 5% growth and 5% decline rules against a baseline of 100
+    snapshot = AlertSnapshot.from_columns([coin], [(association_id, coin.id, 42, None, None, 5.0, 5.0, 100.0)])
+
+    # Two polls inside one window, the price stays 5%+ above the baseline
+    first = evaluate(monitor, snapshot, 106.0)
+    second = evaluate(monitor, snapshot, 107.0)
+    assert len(first[42]) == 1
+    assert not second
+
+    # The opposite rule of the same row is independent
+    assert len(evaluate(monitor, snapshot, 94.0)[42]) == 1
+
+    # A new window compares against the rolled baseline, the rule may fire again
+    monitor.baselines_rolled([coin.id])
+    rolled = AlertSnapshot.from_columns([coin], [(association_id, coin.id, 42, None, None, 5.0, 5.0, 107.0)])
+    assert not evaluate(monitor, rolled, 108.0)
+    assert len(evaluate(monitor, rolled, 113.0)[42]) == 1
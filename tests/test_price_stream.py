@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+from aiohttp import web
+
+from price_stream_server import create_app
+from services.price_stream import PriceStreamClient
+
+COIN_IDS = {"bitcoin", "binancecoin"}
+# The feed knows binancecoin as binance-coin, batches must come back under the subscribed ids
+ID_MAP = {"bitcoin": "bitcoin", "binancecoin": "binance-coin"}
+SERVER_INTERVAL = 0.02
+DEBOUNCE = 0.25
+
+
+async def start_server(port: int = 0) -> web.AppRunner:
+    runner = web.AppRunner(create_app(interval=SERVER_INTERVAL, heartbeat=5), shutdown_timeout=0.5)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+def server_port(runner: web.AppRunner) -> int:
+    return runner.addresses[0][1]
+
+
+async def next_batch(client: PriceStreamClient, timeout: float = 5):
+    batch = await asyncio.wait_for(client.queue.get(), timeout)
+    return time.monotonic(), batch
+
+
+async def wait_until(predicate, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached in time"
+        await asyncio.sleep(0.01)
+
+
+async def collect_batches(client: PriceStreamClient, count: int):
+    # Batches queued before the call were not waited for, their arrival time says nothing about the debounce
+    while not client.queue.empty():
+        client.queue.get_nowait()
+    return [await next_batch(client) for _ in range(count)]
+
+
+def assert_debounced(batches):
+    for _, batch in batches:
+        # Ticks of one coin are coalesced, a batch holds one price per subscribed coin
+        assert set(batch) <= COIN_IDS
+        assert all(isinstance(price, float) and price > 0 for price in batch.values())
+    arrivals = [arrived_at for arrived_at, _ in batches]
+    for previous, current in zip(arrivals, arrivals[1:]):
+        # The server sends every SERVER_INTERVAL, batches are handed over at most once per DEBOUNCE
+        assert current - previous >= DEBOUNCE * 0.8
+
+
+async def run_disconnect_and_reconnect():
+    runner = await start_server()
+    port = server_port(runner)
+    client = PriceStreamClient(url=f"ws://127.0.0.1:{port}/prices", heartbeat=5, stale_timeout=5,
+                               debounce=DEBOUNCE, reconnect_max_delay=0.2, queue_size=16, id_map=ID_MAP)
+    # Ids without a feed id are not streamed
+    client.subscribe(COIN_IDS | {"unmapped-coin"})
+    assert "assets=binance-coin,bitcoin" in client.stream_url()
+    await client.start()
+    try:
+        await wait_until(lambda: client.is_connected)
+        assert_debounced(await collect_batches(client, 4))
+
+        # Server goes away: the client notices and keeps retrying
+        await runner.cleanup()
+        await wait_until(lambda: not client.is_connected)
+
+        runner = await start_server(port)
+        await wait_until(lambda: client.is_connected)
+        assert_debounced(await collect_batches(client, 3))
+    finally:
+        await client.stop()
+        await runner.cleanup()
+
+
+def test_stream_reconnects_and_debounces():
+    asyncio.run(run_disconnect_and_reconnect())
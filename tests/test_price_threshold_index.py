@@ -0,0 +1,81 @@
+import random
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from services.price_threshold_index import PriceThresholdIndex
+
+REARM_BAND = 0.01
+
+
+def reference_apply(states, thresholds, price):
+    """Scalar hysteresis rules: fire armed met thresholds, re-arm fired ones the price left by the band."""
+    fired_min, fired_max, rearmed_min, rearmed_max = set(), set(), set(), set()
+    for association_id, (min_rate, max_rate) in thresholds.items():
+        min_armed, max_armed = states[association_id]
+        if min_rate:
+            if not min_armed and price > min_rate + abs(min_rate) * REARM_BAND:
+                min_armed = True
+                rearmed_min.add(association_id)
+            if min_armed and price <= min_rate:
+                min_armed = False
+                fired_min.add(association_id)
+        if max_rate:
+            if not max_armed and price < max_rate - abs(max_rate) * REARM_BAND:
+                max_armed = True
+                rearmed_max.add(association_id)
+            if max_armed and price >= max_rate:
+                max_armed = False
+                fired_max.add(association_id)
+        states[association_id] = (min_armed, max_armed)
+    return fired_min, fired_max, rearmed_min, rearmed_max
+
+
+def ids(entries):
+    return {entry.association_id for entry in entries}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_apply_price_matches_scalar_hysteresis(seed):
+    generator = random.Random(seed)
+    coin_id = uuid.uuid4()
+    index = PriceThresholdIndex(rearm_band=REARM_BAND)
+
+    thresholds, states = {}, {}
+    associations = []
+    for _ in range(300):
+        association = SimpleNamespace(
+            id=uuid.uuid4(), coin_id=coin_id,
+            min_rate=generator.choice([None, round(generator.uniform(80, 120), 1)]),
+            max_rate=generator.choice([None, round(generator.uniform(80, 120), 1)]),
+            min_alert_armed=generator.random() < 0.8, max_alert_armed=generator.random() < 0.8,
+        )
+        associations.append(association)
+        thresholds[association.id] = (association.min_rate, association.max_rate)
+        states[association.id] = (association.min_alert_armed, association.max_alert_armed)
+    index.rebuild([])
+    for association in associations:
+        index.upsert(association, chat_id=1)
+
+    price = 100.0
+    for step in range(300):
+        price *= 1 + generator.gauss(0, 0.02)
+        if step % 50 == 49:
+            # Edits re-index a threshold as armed, deletions drop it
+            association = generator.choice(associations)
+            # Only a changed threshold is re-indexed
+            association.min_rate = (association.min_rate or 100.0) + generator.choice([-5.0, 5.0])
+            association.min_alert_armed = association.max_alert_armed = True
+            index.upsert(association, chat_id=1)
+            thresholds[association.id] = (association.min_rate, association.max_rate)
+            states[association.id] = (True, True)
+        if step % 70 == 69:
+            association = associations.pop(generator.randrange(len(associations)))
+            index.discard(association.id)
+            del thresholds[association.id], states[association.id]
+
+        transitions = index.apply_price(coin_id, price)
+        expected = reference_apply(states, thresholds, price)
+        assert (ids(transitions.fired_min), ids(transitions.fired_max),
+                ids(transitions.rearmed_min), ids(transitions.rearmed_max)) == expected